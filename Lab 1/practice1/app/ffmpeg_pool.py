@@ -0,0 +1,176 @@
+# Persistent ffmpeg worker pool
+# Jobs go to long-lived ffmpeg containers with `docker exec` (they share the data volume with the API),
+# so no container is started per call. Without configured containers a local ffmpeg stands in.
+# From: https://docs.docker.com/reference/cli/docker/container/exec/
+
+import math
+import os
+import queue
+import socket
+import subprocess
+import tempfile
+import threading
+from typing import List, Optional
+
+
+FFMPEG_WORKER_CONTAINERS = os.environ.get("FFMPEG_WORKER_CONTAINERS", "")  # "a,b" (repeat a name for more slots)
+FFMPEG_WORKER_SERVICE = os.environ.get("FFMPEG_WORKER_SERVICE", "")        # or: every container of this compose service
+FFMPEG_WORKER_PROJECT = os.environ.get("FFMPEG_WORKER_PROJECT", "")        # its compose project (default: our own)
+SHARED_ROOT = os.environ.get("SHARED_ROOT", "/data")                       # shared volume inside this container
+FFMPEG_WORKER_ROOT = os.environ.get("FFMPEG_WORKER_ROOT", "/data")         # shared volume inside the workers
+FFMPEG_WORKER_TIMEOUT = float(os.environ.get("FFMPEG_WORKER_TIMEOUT", 600))
+FFMPEG_WORKER_KILL_GRACE = 10  # seconds the docker client waits past the in-container timeout
+
+
+class DockerExecWorker:
+    """Runs ffmpeg inside an already running container"""
+
+    def __init__(self, container: str):
+        self.container = container
+        self.healthy = True
+
+    def path(self, path: str) -> str:
+        """Same file as seen from the worker; only files on the shared volume are visible there"""
+        path = os.path.abspath(path)
+        rel = os.path.relpath(path, os.path.abspath(SHARED_ROOT))
+        if rel == ".." or rel.startswith(".." + os.sep):
+            raise ValueError(f"{path} is outside the shared volume {SHARED_ROOT}")
+        return os.path.join(FFMPEG_WORKER_ROOT, rel)
+
+    def run(self, args: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """Killing the docker client on a timeout leaves ffmpeg running in the container, so the
+        timeout is enforced in there; if even that does not return, the worker is marked unhealthy
+        """
+        cmd = ["docker", "exec", self.container]
+        if timeout:
+            cmd += ["timeout", "-s", "KILL", str(math.ceil(timeout))]
+        cmd += ["ffmpeg"] + args
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    timeout=timeout + FFMPEG_WORKER_KILL_GRACE if timeout else None)
+        except subprocess.TimeoutExpired:
+            self.healthy = False
+            raise
+        if timeout and result.returncode in (124, 137):  # timeout's own exit status / ffmpeg got SIGKILL
+            raise subprocess.TimeoutExpired(cmd, timeout, result.stdout, result.stderr)
+        return result
+
+
+class LocalWorker:
+    """Stand-in for tests and single-container setups: ffmpeg on this machine, paths unchanged"""
+
+    def __init__(self, binary: str = "ffmpeg"):
+        self.binary = binary
+        self.healthy = True  # subprocess.run kills the local ffmpeg itself on a timeout
+
+    def path(self, path: str) -> str:
+        return path
+
+    def run(self, args: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        return subprocess.run([self.binary] + args, capture_output=True, text=True, timeout=timeout)
+
+
+class WorkerPool:
+    """Fixed set of workers, each running one job at a time; callers wait for a free one
+
+    Unhealthy workers are dropped; once none are left every call fails instead of waiting forever.
+    """
+
+    def __init__(self, workers: List):
+        if not workers:
+            raise ValueError("A worker pool needs at least one worker")
+        self.workers = list(workers)
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        for worker in self.workers:
+            self._free.put(worker)
+
+    def _take(self):
+        worker = self._free.get()
+        if worker is None:  # no healthy worker left, pass the marker on to the next caller
+            self._free.put(None)
+            raise RuntimeError("No healthy ffmpeg worker left")
+        return worker
+
+    def _give_back(self, worker):
+        if worker.healthy:
+            self._free.put(worker)
+            return
+        with self._lock:
+            self.workers.remove(worker)
+            if not self.workers:
+                self._free.put(None)
+
+    def run(self, build_args, timeout: Optional[float] = FFMPEG_WORKER_TIMEOUT) -> subprocess.CompletedProcess:
+        """Run ffmpeg on the next free worker
+
+        build_args(path) gets the worker's path translation and returns the ffmpeg arguments.
+        """
+        worker = self._take()
+        try:
+            return worker.run(build_args(worker.path), timeout)
+        finally:
+            self._give_back(worker)
+
+
+def shared_tempdir() -> tempfile.TemporaryDirectory:
+    """Temp dir the workers can see: under SHARED_ROOT when it is mounted here"""
+    return tempfile.TemporaryDirectory(dir=SHARED_ROOT if os.path.isdir(SHARED_ROOT) else None)
+
+
+def docker(args: List[str]) -> Optional[str]:
+    """stdout of a docker CLI command, None when docker is missing or fails"""
+    try:
+        result = subprocess.run(["docker"] + args, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def compose_project() -> str:
+    """Compose project of this container (its hostname is the container id), "" if unknown"""
+    if FFMPEG_WORKER_PROJECT:
+        return FFMPEG_WORKER_PROJECT
+    out = docker(["inspect", "--format", '{{index .Config.Labels "com.docker.compose.project"}}',
+                  socket.gethostname()])
+    return (out or "").strip()
+
+
+def discover_containers(service: str, project: str) -> List[str]:
+    """Running containers of a compose service in one project (another project's workers mount
+    another shared volume)"""
+    out = docker(["ps", "-q", "--filter", f"label=com.docker.compose.service={service}",
+                  "--filter", f"label=com.docker.compose.project={project}"])
+    return out.split() if out else []
+
+
+def build_pool() -> WorkerPool:
+    """Configured or discovered worker containers, else local ffmpeg (also when docker is unavailable)"""
+    names = [n.strip() for n in FFMPEG_WORKER_CONTAINERS.split(",") if n.strip()]
+    if not names and FFMPEG_WORKER_SERVICE:
+        project = compose_project()
+        if project:
+            names = discover_containers(FFMPEG_WORKER_SERVICE, project)
+    if names:
+        return WorkerPool([DockerExecWorker(n) for n in names])
+    return WorkerPool([LocalWorker() for _ in range(os.cpu_count() or 1)])
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def ffmpeg_pool() -> WorkerPool:
+    """Process-wide pool, built on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = build_pool()
+        return _pool
+
+
+def set_pool(pool: Optional[WorkerPool]):
+    """Swap the pool (e.g. a WorkerPool of LocalWorkers in tests); None rebuilds from the environment"""
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -0,0 +1,64 @@
+# Throughput of the 8x8 DCT block codec (encode / decode), in megapixels per second
+# Usage (from Lab 1/practice1): python benchmarks/bench_codec.py [--width 1920 --height 1080 --quality 50]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.main import TABLE_MODES, decode_image, encode_image
+
+
+def test_image(width: int, height: int) -> np.ndarray:
+    """Smooth gradients plus some noise, closer to a photo than pure noise or a flat frame"""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    rng = np.random.default_rng(0)
+    image = np.stack([128 + 100 * np.sin(x / 97), 128 + 100 * np.cos(y / 61), (x + y) / (width + height) * 255], -1)
+    image += rng.normal(0, 6, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def best_of(repeat: int, fn) -> float:
+    fn()  # warm-up (table / basis caches)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="8x8 DCT block codec throughput")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--quality", type=int, default=50)
+    parser.add_argument("--tables", default="jpeg", choices=list(TABLE_MODES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--gray", action="store_true", help="single plane instead of RGB")
+    args = parser.parse_args()
+
+    image = test_image(args.width, args.height)
+    if args.gray:
+        image = image[..., 0]
+    megapixels = args.width * args.height / 1e6
+
+    bitstream = encode_image(image, args.quality, args.tables)
+    decoded = decode_image(bitstream)
+    mse = np.mean((decoded.astype(np.float64) - image) ** 2)
+    psnr = 10 * np.log10(255 ** 2 / mse) if mse else float("inf")
+
+    encode_s = best_of(args.repeat, lambda: encode_image(image, args.quality, args.tables))
+    decode_s = best_of(args.repeat, lambda: decode_image(bitstream))
+
+    print(f"{args.width}x{args.height} {'gray' if args.gray else 'rgb'} q={args.quality} tables={args.tables}")
+    print(f"  encode  {encode_s * 1e3:8.1f} ms  {megapixels / encode_s:8.2f} MP/s")
+    print(f"  decode  {decode_s * 1e3:8.1f} ms  {megapixels / decode_s:8.2f} MP/s")
+    print(f"  size    {len(bitstream)} bytes  ratio {image.nbytes / len(bitstream):.2f}:1  PSNR {psnr:.2f} dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Latency of /image/resize and /image/blackwhite work: in-memory Pillow engine vs one ffmpeg spawn per request
+# Usage (from Lab 1/practice1): python benchmarks/bench_image.py [--width 1280 --height 720 --repeat 20]
+# The ffmpeg column is skipped when ffmpeg is not on PATH
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.main import ffmpeg_image, pil_black_and_white, pil_resize
+
+
+def test_jpeg(width: int, height: int) -> bytes:
+    y, x = np.mgrid[0:height, 0:width]
+    rgb = np.stack([x * 255 // width, y * 255 // height, (x ^ y) & 255], -1).astype(np.uint8)
+    bio = BytesIO()
+    Image.fromarray(rgb).save(bio, format="JPEG", quality=90)
+    return bio.getvalue()
+
+
+def latencies(repeat: int, fn) -> list:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e3)
+    return times
+
+
+def report(name: str, times: list):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"  {name:<22} median {statistics.median(times):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory vs ffmpeg image processing latency")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--target", default="320x180", help="resize target WxH")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    content = test_jpeg(args.width, args.height)
+    tw, th = (int(v) for v in args.target.split("x"))
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    print(f"{args.width}x{args.height} JPEG ({len(content)} bytes), {args.repeat} runs")
+
+    print(f"resize -> {tw}x{th}")
+    report("pillow (in memory)", latencies(args.repeat, lambda: pil_resize(content, tw, th)))
+    if has_ffmpeg:
+        report("ffmpeg (spawn + disk)", latencies(
+            args.repeat, lambda: ffmpeg_image(content, ".jpg", ["-vf", f"scale={tw}:{th}"], ".jpg")))
+
+    print("black & white, max compression")
+    report("pillow (in memory)", latencies(args.repeat, lambda: pil_black_and_white(content)))
+    if has_ffmpeg:
+        report("ffmpeg (spawn + disk)", latencies(
+            args.repeat, lambda: ffmpeg_image(content, ".jpg", ["-vf", "format=gray", "-q:v", "31"], ".jpg")))
+
+    if not has_ffmpeg:
+        print("ffmpeg not found on PATH, spawn-per-request path not measured")
+
+
+if __name__ == "__main__":
+    main()
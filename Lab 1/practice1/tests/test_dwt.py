@@ -0,0 +1,32 @@
+# /image/dwt answers 400 for uploads that are not decodable images
+
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def png_bytes(size=(64, 64)) -> bytes:
+    bio = BytesIO()
+    Image.new("L", size, 128).save(bio, format="PNG")
+    return bio.getvalue()
+
+
+def test_dwt_of_an_image():
+    response = client.post("/image/dwt?format=npz", files={"file": ("a.png", png_bytes())})
+    assert response.status_code == 200
+
+
+def test_dwt_rejects_a_non_image():
+    response = client.post("/image/dwt", files={"file": ("a.png", b"not an image")})
+    assert response.status_code == 400
+
+
+def test_dwt_rejects_a_truncated_image():
+    data = png_bytes((256, 256))
+    response = client.post("/image/dwt", files={"file": ("a.png", data[:len(data) // 2])})
+    assert response.status_code == 400
@@ -6,6 +6,7 @@ import numpy as np
 import pywt
 import numpy as np
 from scipy.fftpack import dct, idct
+from functools import lru_cache
 
 
 ###############################################################
@@ -30,6 +31,56 @@ def yuv_to_rgb(Y, U, V):
     b = Y + 2.032 * U
     return r, g, b
 
+# Same conversions for a whole HxWx3 frame at once: one (N, 3) x (3, 3) matrix product instead of one call per pixel
+RGB_TO_YUV = np.array([[0.299, 0.587, 0.114],
+                       [-0.147, -0.289, 0.436],
+                       [0.615, -0.515, -0.100]], dtype=np.float32)
+YUV_TO_RGB = np.array([[1.0, 0.0, 1.140],
+                       [1.0, -0.395, -0.581],
+                       [1.0, 2.032, 0.0]], dtype=np.float32)
+
+# Q8 fixed-point versions of the same matrices (coefficients * 256, rounded) for integer-only math
+RGB_TO_YUV_Q8 = np.rint(RGB_TO_YUV * 256).astype(np.int32)
+YUV_TO_RGB_Q8 = np.rint(YUV_TO_RGB * 256).astype(np.int32)
+
+# Integer (N, 3) x (3, 3) product with a Q8 matrix, rounded back to whole units
+def q8_product(frame, matrix):
+    pixels = frame.reshape(-1, 3).astype(np.int32)
+    return ((pixels @ matrix.T + 128) >> 8).reshape(frame.shape)
+
+# Convert a frame from RGB to YUV (fixed_point: same conversion in Q8 integer math, uint8 in, int16 out)
+def rgb_to_yuv_frame(frame, fixed_point=False):
+    if fixed_point:
+        return q8_product(frame, RGB_TO_YUV_Q8).astype(np.int16)
+    pixels = frame.reshape(-1, 3).astype(np.float32, copy=False)
+    return (pixels @ RGB_TO_YUV.T).reshape(frame.shape)
+
+# Convert a frame from YUV to RGB (fixed_point: integer YUV in, uint8 out)
+def yuv_to_rgb_frame(frame, fixed_point=False):
+    if fixed_point:
+        return np.clip(q8_product(frame, YUV_TO_RGB_Q8), 0, 255).astype(np.uint8)
+    pixels = frame.reshape(-1, 3).astype(np.float32, copy=False)
+    return (pixels @ YUV_TO_RGB.T).reshape(frame.shape)
+
+# Studio range BT.601 YCbCr (Y 16-235, Cb/Cr 16-240 around 128) is a different colour space from the YUV above,
+# with the usual 8-bit integer formulas: uint8 in and out, no float temporaries
+def rgb_to_ycbcr_bt601_frame(frame):
+    r, g, b = (frame[..., i].astype(np.int32) for i in range(3))
+    out = np.empty(frame.shape, dtype=np.uint8)
+    out[..., 0] = ((66 * r + 129 * g + 25 * b + 128) >> 8) + 16
+    out[..., 1] = ((-38 * r - 74 * g + 112 * b + 128) >> 8) + 128
+    out[..., 2] = ((112 * r - 94 * g - 18 * b + 128) >> 8) + 128
+    return out
+
+def ycbcr_bt601_to_rgb_frame(frame):
+    c = frame[..., 0].astype(np.int32) - 16
+    d = frame[..., 1].astype(np.int32) - 128
+    e = frame[..., 2].astype(np.int32) - 128
+    out = np.empty(frame.shape, dtype=np.uint8)
+    out[..., 0] = np.clip((298 * c + 409 * e + 128) >> 8, 0, 255)
+    out[..., 1] = np.clip((298 * c - 100 * d - 208 * e + 128) >> 8, 0, 255)
+    out[..., 2] = np.clip((298 * c + 516 * d + 128) >> 8, 0, 255)
+    return out
 
 ###############################################################
 
@@ -64,14 +115,37 @@ def zig_zag_index(k, n):
     j = k - i * (i + 1) // 2
     return (j, i - j) if i & 1 else (i - j, j)
 
-# From here, the serpentine function can be implemented using this zig-zag index function to get the elements in the correct order.
+# The zig-zag order only depends on the block size, so we compute the whole permutation once and cache it.
+# Same walk as zig_zag_index (anti-diagonal s = i + j, down on odd s, up on even s) and it also works for non-square blocks.
+@lru_cache(maxsize=None)
+def zig_zag_order(rows, cols):
+    i, j = np.indices((rows, cols)).reshape(2, -1)
+    s = i + j
+    order = np.lexsort((np.where(s & 1, i, -i), s))
+    order.flags.writeable = False
+    return order
+
+# Permutation that puts a zig-zag scan back in raster order (for decoding)
+@lru_cache(maxsize=None)
+def zig_zag_inverse(rows, cols):
+    inverse = np.argsort(zig_zag_order(rows, cols))
+    inverse.flags.writeable = False
+    return inverse
+
+# Scan a block, or a stack of blocks (..., rows, cols), with one fancy-indexing operation
+def zig_zag_scan(blocks):
+    blocks = np.asarray(blocks)
+    rows, cols = blocks.shape[-2:]
+    return blocks.reshape(*blocks.shape[:-2], rows * cols)[..., zig_zag_order(rows, cols)]
+
+# Inverse scan: (..., rows * cols) back to (..., rows, cols)
+def zig_zag_unscan(scans, rows, cols):
+    scans = np.asarray(scans)
+    return scans[..., zig_zag_inverse(rows, cols)].reshape(*scans.shape[:-1], rows, cols)
+
+# From here, the serpentine function is just the zig-zag scan of the matrix.
 def serpentine(matrix):
-    n = matrix.shape[0] 
-    result = []
-    for k in range(n * n):
-        i, j = zig_zag_index(k, n)
-        result.append(matrix[i, j])
-    return result
+    return zig_zag_scan(matrix).tolist()
 
 
 ###############################################################
@@ -94,18 +168,27 @@ def black_and_white_max_compression(input_path, output_path):
 # EX 6
 
 # RLE from: https://www.geeksforgeeks.org/dsa/run-length-encoding/
+# Instead of walking the input one character at a time, the runs are found with numpy:
+# a run starts wherever a value differs from the previous one, and its length is the distance to the next start.
+# This works for bytes and for integer arrays (e.g. the zig-zag of quantized DCT coefficients).
+def rle_runs(values):
+    values = np.asarray(values).ravel()
+    if values.size == 0:
+        return values, np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    lengths = np.diff(np.append(starts, values.size))
+    return values[starts], lengths
+
+# Decoder: repeat every value as many times as its run length
+def rle_expand(values, lengths):
+    return np.repeat(values, lengths)
+
+# String version: every character followed by its count, now returned instead of printed
 def RLE(st):
-    n = len(st)
-    i = 0
-    while i < n:
-        # Count occurrences of current character
-        count = 1
-        while i < n - 1 and st[i] == st[i + 1]:
-            count += 1
-            i += 1
-        # Print character and its count
-        print(st[i] + str(count), end="")
-        i += 1
+    if not st:
+        return ""
+    codes, counts = rle_runs(np.frombuffer(st.encode("utf-32-le"), dtype="<u4"))
+    return "".join(chr(c) + str(n) for c, n in zip(codes.tolist(), counts.tolist()))
 
 ###############################################################
 
@@ -187,7 +270,7 @@ if __name__ == "__main__":
 
 
     #st = "00011000110011"
-    #RLE(st)
+    #print(RLE(st))
 
     data = [1, 2, 3, 4]
     #encoded = DCT.encode(data)
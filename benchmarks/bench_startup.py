@@ -0,0 +1,77 @@
+# Cold-start cost of every API app: time to import the app module and RSS right after, in a fresh interpreter
+# Usage (from the repository root): python benchmarks/bench_startup.py [--repeat 5] [--json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, app directory, module uvicorn loads)
+APPS = [
+    ("Lab 1/practice1", os.path.join(ROOT, "Lab 1", "practice1"), "app.main"),
+    ("lab2 (merge_main)", os.path.join(ROOT, "lab2"), "app.merge_main"),
+    ("lab2 (main)", os.path.join(ROOT, "lab2"), "app.main"),
+    ("seminar2", os.path.join(ROOT, "seminar2"), "app.main"),
+]
+
+HEAVY_MODULES = ["numpy", "scipy", "pywt", "PIL", "matplotlib"]
+
+# Runs in the child interpreter; ru_maxrss is in KiB on Linux
+PROBE = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": elapsed,
+    "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(directory: str, module: str) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and RSS of each API app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for name, directory, module in APPS:
+        runs = [measure(directory, module) for _ in range(args.repeat)]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            results[name] = {"error": runs[0]["error"]}
+            continue
+        results[name] = {
+            "import_ms": statistics.median(r["import_s"] for r in ok) * 1e3,
+            "rss_mib": statistics.median(r["rss_mib"] for r in ok),
+            "heavy_loaded": ok[-1]["heavy_loaded"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'app':<20} {'import (ms)':>12} {'RSS (MiB)':>10}  heavy modules loaded at startup")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<20} {'error: ' + r['error']}")
+        else:
+            print(f"{name:<20} {r['import_ms']:>12.1f} {r['rss_mib']:>10.1f}  {', '.join(r['heavy_loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Content-addressed cache of ffmpeg outputs
+# Key = SHA-256 of the input + operation name + normalized parameters, LRU eviction by total size
+# Entries handed out by fetch() are pinned (never evicted) until the caller releases them
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", Path(tempfile.gettempdir()) / "video_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file read in fixed-size chunks"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(input_hash: str, op: str, params: dict) -> str:
+    """Stable key: same input, operation and parameters -> same key"""
+    payload = json.dumps({"input": input_hash, "op": op, "params": params},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Disk-backed LRU cache of output files, bounded by total size"""
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Path]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pins: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        """Rebuild the LRU order from what is already on disk (mtime = last use)"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = [p for p in self.root.glob("??/*") if p.is_file() and not p.name.startswith(".")]
+        for path in sorted(found, key=lambda p: p.stat().st_mtime):
+            key = path.name.split(".")[0]
+            self._entries[key] = path
+            self._sizes[key] = path.stat().st_size
+        self._evict()
+
+    @property
+    def size(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, input_hash: str, op: str, params: dict, pin: bool = False) -> Optional[Path]:
+        """Cached output path or None; a hit refreshes its LRU position (pin=True: caller must release it)"""
+        key = cache_key(input_hash, op, params)
+        with self._lock:
+            path = self._entries.get(key)
+            if path is None or not path.exists():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        os.utime(path)
+        return path
+
+    def put(self, input_hash: str, op: str, params: dict, output_path: Path, pin: bool = False) -> Path:
+        """Move a freshly produced output into the cache and return its new path
+
+        Outputs larger than the whole budget are not cached: the produced file is returned where it is.
+        """
+        size = output_path.stat().st_size
+        if size > self.max_bytes:
+            return output_path
+        key = cache_key(input_hash, op, params)
+        dest = self.root / key[:2] / f"{key}{output_path.suffix}"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.parent / f".{key}.tmp"
+        shutil.move(str(output_path), tmp)
+        os.replace(tmp, dest)
+        with self._lock:
+            self._entries[key] = dest
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict(keep=key)
+        return dest
+
+    def release(self, path: Path):
+        """Unpin a path returned by fetch() once it has been served or consumed (no-op for uncached paths)"""
+        key = Path(path).name.split(".")[0]
+        with self._lock:
+            count = self._pins.get(key, 0)
+            if count <= 1:
+                self._pins.pop(key, None)
+            else:
+                self._pins[key] = count - 1
+            self._evict()
+
+    async def fetch(self, input_hash: str, op: str, params: dict, output_path: Path,
+                    produce: Callable[[], Awaitable[None]]) -> Path:
+        """Return the cached output, or run produce() once (even for concurrent callers) and cache it
+
+        The returned path stays pinned until release(path) is called.
+        """
+        cached = self.get(input_hash, op, params, pin=True)
+        if cached is not None:
+            return cached
+
+        key = cache_key(input_hash, op, params)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            produced = await asyncio.shield(pending)
+            shared = self.get(input_hash, op, params, pin=True) if produced is not None else None
+            if shared is not None:
+                return shared
+            # Too large to cache (the producer's file is its own): make our own copy
+            await produce()
+            return self.put(input_hash, op, params, output_path, pin=True)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await produce()
+            path = self.put(input_hash, op, params, output_path, pin=True)
+            future.set_result(path if path != output_path else None)
+            return path
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark as retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _drop(self, key: str):
+        path = self._entries.pop(key, None)
+        self._sizes.pop(key, None)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove least recently used entries until under the size limit, skipping pinned ones and `keep`"""
+        total = self.size
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep or self._pins.get(key):
+                continue
+            total -= self._sizes.get(key, 0)
+            self._drop(key)
+            self.evictions += 1
+
+    @asynccontextmanager
+    async def use(self, input_hash: str, op: str, params: dict, output_path: Path,
+                  produce: Callable[[], Awaitable[None]]) -> AsyncIterator[Path]:
+        """fetch() pinned for the duration of the block (for outputs read by later ffmpeg steps)"""
+        path = await self.fetch(input_hash, op, params, output_path, produce)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "pinned": len(self._pins),
+            }
+
+
+cache = ResultCache()
@@ -0,0 +1,93 @@
+# Spatial / temporal complexity of a source from a few downscaled gray frames
+# SI = std of the Sobel gradient magnitude, TI = std of the difference between consecutive frames
+# (max over the samples, as in ITU-T P.910), computed in NumPy on frames read from an ffmpeg rawvideo pipe
+# From: https://www.itu.int/rec/T-REC-P.910
+
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.metrics import ffmpeg_op
+from app.probe import duration, first_stream, probes
+from app.runner import stream_ffmpeg
+
+
+# Frames are analysed at this width (height keeps the aspect ratio)
+ANALYSIS_WIDTH = 320
+
+# Pairs of consecutive frames sampled evenly over the analysed span
+ANALYSIS_PAIRS = 6
+
+
+def analysis_size(width: int, height: int, target: int = ANALYSIS_WIDTH) -> tuple:
+    """Even-sized downscale (never upscales)"""
+    scale = min(1.0, target / width) if width else 1.0
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+@ffmpeg_op("analysis")
+async def sample_gray_frames(input_path: Path, width: int, height: int, pairs: int, step: int,
+                             seconds: float):
+    """Frames n, n+1 every `step` frames, scaled to width x height, as a (frames, height, width) uint8 array"""
+    import numpy as np  # only needed here, keeps the API's startup light
+
+    cmd = ["ffmpeg", "-v", "error", "-t", str(seconds), "-i", str(input_path),
+           "-vf", f"select=lt(mod(n\\,{step})\\,2),scale={width}:{height},format=gray",
+           "-vsync", "passthrough", "-frames:v", str(2 * pairs),
+           "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+    data = b"".join([chunk async for chunk in await stream_ffmpeg(cmd)])
+    frame_bytes = width * height
+    count = len(data) // frame_bytes
+    return np.frombuffer(data[:count * frame_bytes], dtype=np.uint8).reshape(count, height, width)
+
+
+def spatial_information(frames) -> float:
+    """Max over frames of the std of the Sobel gradient magnitude"""
+    import numpy as np
+
+    f = frames.astype(np.float32)
+    # 3x3 Sobel on the interior, with slicing instead of a convolution
+    gx = (f[:, :-2, 2:] + 2 * f[:, 1:-1, 2:] + f[:, 2:, 2:]) - (f[:, :-2, :-2] + 2 * f[:, 1:-1, :-2] + f[:, 2:, :-2])
+    gy = (f[:, 2:, :-2] + 2 * f[:, 2:, 1:-1] + f[:, 2:, 2:]) - (f[:, :-2, :-2] + 2 * f[:, :-2, 1:-1] + f[:, :-2, 2:])
+    magnitude = np.sqrt(gx * gx + gy * gy)
+    return float(magnitude.reshape(len(f), -1).std(axis=1).max()) if len(f) else 0.0
+
+
+def temporal_information(frames) -> float:
+    """Max over the sampled pairs (0-1, 2-3, ...) of the std of the frame difference"""
+    import numpy as np
+
+    pairs = len(frames) // 2
+    if not pairs:
+        return 0.0
+    f = frames[:2 * pairs].astype(np.float32).reshape(pairs, 2, -1)
+    return float((f[:, 1] - f[:, 0]).std(axis=1).max())
+
+
+# SI / TI values treated as "very complex" when normalising to a 0..1 score (analysis resolution)
+SI_HIGH = 120.0
+TI_HIGH = 40.0
+
+
+async def analyse(input_path: Path, digest: Optional[str] = None, seconds: float = 20,
+                  pairs: int = ANALYSIS_PAIRS) -> dict:
+    """SI, TI and a 0..1 complexity score of the first `seconds` of the source"""
+    info = await probes.probe(input_path, digest)
+    video = first_stream(info, "video")
+    if video is None or not video.get("width") or not video.get("height"):
+        raise HTTPException(status_code=400, detail="Input has no video stream")
+
+    num, _, den = str(video.get("avg_frame_rate") or "0/0").partition("/")
+    fps = float(num) / float(den) if den and float(den) else 25.0
+    span = min(seconds, duration(info) or seconds)
+    step = max(2, int(fps * span) // pairs)
+
+    width, height = analysis_size(video["width"], video["height"])
+    frames = await sample_gray_frames(input_path, width, height, pairs, step, span)
+    if len(frames) < 2:
+        raise HTTPException(status_code=400, detail="Could not decode frames to analyse")
+    si, ti = spatial_information(frames), temporal_information(frames)
+    score = min(1.0, 0.5 * si / SI_HIGH + 0.5 * ti / TI_HIGH)
+    return {"si": round(si, 2), "ti": round(ti, 2), "score": round(score, 3), "frames": len(frames),
+            "source": {"width": video["width"], "height": video["height"], "fps": round(fps, 3)}}
@@ -0,0 +1,230 @@
+# Background job queue for long transcodes: submit -> poll -> fetch
+# From: https://docs.python.org/3/library/asyncio-queue.html
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.runner import progress_sink
+
+
+# In-process workers pulling from the queue (ffmpeg itself is also bounded by the runner pool)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+
+# Finished jobs kept in memory for polling before the oldest are forgotten
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 200))
+
+# A running job whose ffmpeg output time has not moved for this long is reported as stalled
+JOB_STALL_SECONDS = float(os.environ.get("JOB_STALL_SECONDS", 60))
+
+
+###############################################################
+# JOB
+###############################################################
+
+class Job:
+    """One queued transcode and everything a client can poll about it"""
+
+    def __init__(self, kind: str, workdir: Path, func: Callable[["Job"], Awaitable[List[Path]]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.workdir = workdir
+        self.func = func
+        self.status = "queued"          # queued -> running -> done | failed
+        self.progress = 0.0
+        self.error: Optional[str] = None
+        self.outputs: List[Path] = []
+        self.result: dict = {}          # extra JSON a job wants to return next to its files
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.expected_duration: Optional[float] = None  # media seconds each ffmpeg step writes (for progress/ETA)
+        self.step = 0                   # ffmpeg processes started so far
+        self.runs: Dict[int, dict] = {}  # last progress block of each ffmpeg process still running
+        self.last_activity = self.created
+        self.version = 0                # bumped on every change, subscribers wait for a new one
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def output(self, name: Optional[str] = None) -> Path:
+        """Find an output file by name (or the only one)"""
+        if not self.outputs:
+            raise HTTPException(status_code=404, detail="Job has no outputs")
+        if name is None:
+            if len(self.outputs) > 1:
+                raise HTTPException(status_code=400, detail="Job has several outputs, pass ?name=")
+            return self.outputs[0]
+        for path in self.outputs:
+            if path.name == name:
+                return path
+        raise HTTPException(status_code=404, detail=f"No output named {name}")
+
+    ###########################################################
+    # LIVE PROGRESS
+    ###########################################################
+
+    def report(self, stats: dict):
+        """progress_sink of this job: one call per ffmpeg -progress block (plus start/exit of each process)"""
+        now = time.time()
+        run_id, state = stats["run"], stats["progress"]
+        if state == "start":
+            self.step += 1
+            self.runs[run_id] = {}
+            self.last_activity = now
+        elif state == "exit":
+            self.runs.pop(run_id, None)
+            self.last_activity = now
+        else:
+            previous = self.runs.get(run_id, {})
+            if (stats["out_time"] or 0) > (previous.get("out_time") or 0) or state == "end":
+                self.last_activity = now
+            # Fields ffmpeg reports as N/A keep their last known value
+            self.runs[run_id] = {**previous, **{k: v for k, v in stats.items()
+                                                if v is not None and k not in ("run", "progress")}}
+            self.progress = self._step_fraction()
+        self.notify()
+
+    def _step_fraction(self) -> float:
+        """Progress of the current step: slowest running process over the expected output duration"""
+        if not self.expected_duration or not self.runs:
+            return 0.0
+        times = [r.get("out_time") or 0 for r in self.runs.values()]
+        return min(0.99, min(times) / self.expected_duration)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until the current ffmpeg step(s) finish, from the remaining media time and ffmpeg's speed"""
+        if not self.expected_duration or not self.runs:
+            return None
+        remaining = []
+        for r in self.runs.values():
+            if not r.get("speed") or r.get("out_time") is None:
+                return None
+            remaining.append(max(0.0, self.expected_duration - r["out_time"]) / r["speed"])
+        return max(remaining)
+
+    @property
+    def stalled(self) -> bool:
+        return self.status == "running" and time.time() - self.last_activity > JOB_STALL_SECONDS
+
+    def notify(self):
+        """Wake every subscriber waiting in changed()"""
+        self.version += 1
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def changed(self, since: int, timeout: float) -> bool:
+        """Wait until version moves past `since` (False on timeout)"""
+        if self.version != since:
+            return True
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def live(self) -> dict:
+        eta = self.eta
+        return {
+            "step": self.step,
+            "ffmpeg": list(self.runs.values()),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "stalled": self.stalled,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            **self.live(),
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "outputs": [{"name": p.name, "url": f"/jobs/{self.id}/result?name={p.name}"}
+                        for p in self.outputs],
+            **self.result,
+        }
+
+
+###############################################################
+# QUEUE
+###############################################################
+
+class JobQueue:
+    """asyncio queue drained by a fixed number of worker tasks"""
+
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self):
+        """Workers are started lazily inside the running event loop"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def submit(self, kind: str, workdir: Path, func: Callable[[Job], Awaitable[List[Path]]]) -> Job:
+        """Queue a job and return immediately"""
+        self._ensure_workers()
+        job = Job(kind, workdir, func)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job
+
+    def _prune(self):
+        """Forget the oldest finished jobs once the history is full"""
+        finished = [j.id for j in self.jobs.values() if j.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started = job.last_activity = time.time()
+            job.notify()
+            token = progress_sink.set(job.report)
+            try:
+                job.outputs = list(await job.func(job))
+                job.status = "done"
+                job.progress = 1.0
+            except HTTPException as e:
+                job.status, job.error = "failed", str(e.detail)
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            finally:
+                progress_sink.reset(token)
+                job.runs.clear()
+                job.finished = time.time()
+                job.notify()
+                self._queue.task_done()
+
+
+queue = JobQueue()
@@ -1,25 +1,43 @@
 # From: https://fastapi.tiangolo.com/tutorial/first-steps/#deploy-your-app-optional
 
-from fastapi import FastAPI, UploadFile, File, Response
+from fastapi import FastAPI, UploadFile, File, Response, HTTPException
 from pydantic import BaseModel
 import subprocess
-import numpy as np
-import pywt
-from scipy.fftpack import dct, idct
 from typing import List, Tuple
-import base64
-from io import BytesIO
+import hashlib
 import tempfile
 import os
-from PIL import Image
-import matplotlib.image as mpimg
-import matplotlib.pyplot as plt
+import shutil
+from pathlib import Path
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 
 
 app = FastAPI()
 
 
+###############################################################
+# Uploads are streamed to disk in fixed-size chunks so big videos never sit whole in RAM
+
+UPLOAD_CHUNK = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 4 * 1024 ** 3))
+
+async def save_upload(file: UploadFile, in_path: str) -> str:
+    """Write the upload to in_path chunk by chunk and return its SHA-256"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(in_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    if size > MAX_UPLOAD_BYTES:
+        os.remove(in_path)
+        raise HTTPException(status_code=413, detail="Upload too large")
+    return digest.hexdigest()
+
 ###############################################################
 # EX 1 - convert
 
@@ -47,7 +65,9 @@ def convert(input_path: str, format: int, output_path: str):
     elif (format == 3):
         cmd = ["ffmpeg", "-y", "-i", twenty_seconds, "-c:v", "libaom-av1", "-crf", "30", "-c:a", "aac", output_path]            # added -c:a aac for audio --> before, only audio was saved into output
     
-    return subprocess.run(cmd, capture_output=True)
+    result = subprocess.run(cmd, capture_output=True)
+    shutil.rmtree(td, ignore_errors=True)                                                   # the 20 s clip is only an intermediate
+    return result
 
 ###############################################################
 
@@ -75,7 +95,10 @@ def encoding_ladder(input_path: str, output_dir: str):
 
         # 2. Convert using EX1
         out_path = os.path.join(output_dir, filename)                                   # final output path
-        convert(scaled, codec, out_path)                                                # run convert to target codec
+        try:
+            convert(scaled, codec, out_path)                                            # run convert to target codec
+        finally:
+            Path(scaled).unlink(missing_ok=True)                                        # not part of the ladder (may not exist if scaling failed)
 
 #############################################################
 
@@ -114,20 +137,20 @@ async def api_convert(file: UploadFile = File(...), format: int = 0):
     else:
         return {"error": "Invalid format"}
     
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
     
     result = convert(in_path, format, out_path)
     
     if result.returncode != 0:
+        shutil.rmtree(td, ignore_errors=True)
         return {"error": result.stderr}
     
-    # Return appropriate content type
+    # Return appropriate content type, workspace is deleted once the file has been sent
+    cleanup = BackgroundTask(shutil.rmtree, td, ignore_errors=True)
     if format == 0 or format == 1:
-        return FileResponse(out_path, media_type="video/webm", filename="converted.webm")
+        return FileResponse(out_path, media_type="video/webm", filename="converted.webm", background=cleanup)
     else:
-        return FileResponse(out_path, media_type="video/mp4", filename="converted.mp4")
+        return FileResponse(out_path, media_type="video/mp4", filename="converted.mp4", background=cleanup)
 
 
 @app.post("/video/encoding-ladder")
@@ -138,8 +161,7 @@ async def api_encoding_ladder(file: UploadFile = File(...)):
     in_path = os.path.join(td, "input" + suffix)
 
     # Save uploaded file
-    with open(in_path, "wb") as f:
-        f.write(await file.read())
+    await save_upload(file, in_path)
 
     # Run ladder
     encoding_ladder(in_path, td)
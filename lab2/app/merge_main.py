@@ -1,46 +1,98 @@
 # LAB 2 and SEMI 2 done with Claude Sonnet 4.2 to reduce lines of the code and have less redundancy
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
-import subprocess
-import tempfile
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 from contextlib import contextmanager
 
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+
+from app.runner import run_ffmpeg, stream_ffmpeg
+from app.metrics import MetricsMiddleware, ffmpeg_op, render as render_metrics, upload_bytes
+from app.jobs import Job, queue
+from app.cache import cache
+from app.complexity import analyse
+from app.mp4box import movie_info, parse_tracks
+from app.probe import duration, first_stream, probes
+from app.quality import score_output, score_outputs
+from app.scratch import scratch
+from app.tiers import SPEED_TIERS, TIER_OPTIONS, check_tier, speeds, tier_options
+from app.trim import trimmed_clip
 
 app = FastAPI(title="Video Processing API", version="2.0")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.add_middleware(MetricsMiddleware)
 
 ###############################################################
 # UTILITIES
 ###############################################################
 
 @contextmanager
-def temp_workspace():
-    """Context manager for temporary directories"""
-    td = tempfile.mkdtemp()
+def temp_workspace(keep: bool = False, intermediate: bool = False):
+    """Context manager for scratch directories
+
+    Deleted on exit unless keep=True, in which case the caller releases it
+    (e.g. after the response is sent) or the scratch store evicts it by TTL/quota.
+    intermediate=True puts it on the tmpfs scratch root when one is configured.
+    """
+    td = scratch.create(intermediate=intermediate)
+    ok = False
     try:
-        yield Path(td)
+        yield td
+        ok = True
     finally:
-        pass  # Cleanup handled by system
+        if keep and ok:
+            scratch.unpin(td)
+        else:
+            scratch.release(td)
 
 
-def run_ffmpeg(cmd: list, check: bool = True) -> subprocess.CompletedProcess:
-    """Unified FFmpeg command runner with error handling"""
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if check and result.returncode != 0:
-        raise HTTPException(status_code=500, detail=f"FFmpeg error: {result.stderr}")
-    return result
+def release_after(td: Path, cached: Optional[Path] = None) -> BackgroundTask:
+    """Delete a workspace (and unpin the cache entry being served) once the response has been sent"""
+    def release():
+        if cached is not None:
+            cache.release(cached)
+        scratch.release(td)
+    return BackgroundTask(release)
+
+
+# Uploads are streamed to disk in fixed-size chunks, memory per request stays constant
+UPLOAD_CHUNK = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 4 * 1024 ** 3))
+
+
+async def ingest_upload(file: UploadFile, path: Path) -> Tuple[Path, str]:
+    """Stream uploaded file to path, returning it with its SHA-256"""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    full_path = path / Path(file.filename or "upload").name
+    digest = hashlib.sha256()
+    size = 0
+    with open(full_path, "wb") as out:
+        while chunk := await file.read(UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            upload_bytes.inc(len(chunk))
+
+    if size > MAX_UPLOAD_BYTES:
+        full_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="Upload too large")
+    return full_path, digest.hexdigest()
 
 
 async def save_upload(file: UploadFile, path: Path) -> Path:
     """Save uploaded file to path"""
-    full_path = path / file.filename
-    content = await file.read()
-    full_path.write_bytes(content)
+    full_path, _ = await ingest_upload(file, path)
     return full_path
 
 
@@ -48,74 +100,121 @@ async def save_upload(file: UploadFile, path: Path) -> Path:
 # CORE VIDEO FUNCTIONS
 ###############################################################
 
-def resize_video(input_path: Path, width: int, height: int, output_path: Path):
+# convert / bbb / ladder work on the first CLIP_SECONDS of the source
+CLIP_SECONDS = 20
+
+
+@ffmpeg_op("resize")
+async def resize_video(input_path: Path, width: int, height: int, output_path: Path):
     """Resize video using FFmpeg"""
     cmd = ["ffmpeg", "-y", "-i", str(input_path), 
            "-vf", f"scale={width}:{height}", str(output_path)]
-    run_ffmpeg(cmd)
+    await run_ffmpeg(cmd)
 
 
-def chroma_subsampling(input_path: Path, output_path: Path):
+@ffmpeg_op("chroma")
+async def chroma_subsampling(input_path: Path, output_path: Path):
     """Apply chroma subsampling"""
     cmd = ["ffmpeg", "-y", "-i", str(input_path),
            "-vf", "format=yuv422p", "-c:v", "libx264", str(output_path)]
-    run_ffmpeg(cmd)
+    await run_ffmpeg(cmd)
+
+
+# Streamable containers: fragmented MP4 / WebM can be written to a pipe while encoding
+STREAM_FORMATS = {
+    "mp4": (["-c:v", "libx264", "-c:a", "aac",
+             "-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"], "video/mp4"),
+    "webm": (["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8",
+              "-c:a", "libopus", "-f", "webm"], "video/webm"),
+}
+
 
+@ffmpeg_op("stream")
+async def stream_filter(input_path: Path, video_filter: str, container: str,
+                        background: Optional[BackgroundTask] = None) -> StreamingResponse:
+    """Apply a video filter and stream the encoded output while ffmpeg is still running"""
+    if container not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid container")
+    mux_opts, media_type = STREAM_FORMATS[container]
+    cmd = (["ffmpeg", "-v", "error", "-i", str(input_path), "-vf", video_filter]
+           + mux_opts + ["pipe:1"])
+    return StreamingResponse(await stream_ffmpeg(cmd), media_type=media_type, background=background)
 
-def get_video_info(input_path: Path) -> str:
-    """Get video metadata using ffprobe"""
-    cmd = ["ffprobe", "-v", "quiet", "-print_format", "json",
-           "-show_format", "-show_streams", str(input_path)]
-    return run_ffmpeg(cmd).stdout
 
+@ffmpeg_op("info")
+async def get_video_info(input_path: Path, digest: Optional[str] = None) -> str:
+    """Get video metadata using ffprobe (probed once per distinct input)"""
+    return json.dumps(await probes.probe(input_path, digest))
 
-def create_bbb_container(input_path: Path, output_path: Path):
+
+# Video codecs the mp4 muxer accepts as they are; anything else (VP8, Theora...) is re-encoded
+MP4_VIDEO_CODECS = {"h264", "hevc", "av1", "vp9", "mpeg4", "mpeg2video", "mpeg1video", "mjpeg"}
+
+
+@ffmpeg_op("bbb_container")
+async def create_bbb_container(input_path: Path, output_path: Path, digest: Optional[str] = None):
     """Create BBB container with multiple audio tracks"""
-    with temp_workspace() as td:
-        clip = td / "clip_20s.mp4"
-        wav = td / "audio.wav"
-        
-        # Extract 20 second clip and audio
-        run_ffmpeg(["ffmpeg", "-i", str(input_path), "-ss", "00:00", "-to", "00:20", str(clip)])
-        run_ffmpeg(["ffmpeg", "-y", "-i", str(clip), "-q:a", "0", "-map", "a", str(wav)])
-        
-        # Encode to different formats
-        audio_tracks = {
-            "aac": (td / "audio.aac", ["-c:a", "aac", "-b:a", "128k"]),
-            "mp3": (td / "audio.mp3", ["-ac", "2", "-b:a", "192k"]),
-            "ac3": (td / "audio.ac3", ["-c:a", "ac3", "-b:a", "192k"])
-        }
-        
-        for path, codec_opts in audio_tracks.values():
-            run_ffmpeg(["ffmpeg", "-i", str(wav)] + codec_opts + [str(path)])
-        
-        # Multiplex all tracks
-        cmd = ["ffmpeg", "-y", "-i", str(clip)]
-        for path, _ in audio_tracks.values():
-            cmd.extend(["-i", str(path)])
-        cmd.extend(["-map", "0:v:0", "-map", "1:a:0", "-map", "2:a:0", "-map", "3:a:0",
-                   "-c:v", "copy", "-c:a", "copy", str(output_path)])
-        run_ffmpeg(cmd)
+    info = await probes.probe(input_path, digest)
+    if first_stream(info, "audio") is None:
+        raise HTTPException(status_code=400, detail="Input has no audio track")
+    video = first_stream(info, "video") or {}
+    copy_video = video.get("codec_name") in MP4_VIDEO_CODECS
+
+    # 20 second clip, stream-copied and shared with convert_codec through the cache
+    async with trimmed_clip(input_path, digest, duration=CLIP_SECONDS) as clip:
+        with temp_workspace(intermediate=True) as td:
+            wav = td / "audio.wav"
+
+            # Extract audio
+            await run_ffmpeg(["ffmpeg", "-y", "-i", str(clip), "-q:a", "0", "-map", "a", str(wav)])
+
+            # Encode to different formats
+            audio_tracks = {
+                "aac": (td / "audio.aac", ["-c:a", "aac", "-b:a", "128k"]),
+                "mp3": (td / "audio.mp3", ["-ac", "2", "-b:a", "192k"]),
+                "ac3": (td / "audio.ac3", ["-c:a", "ac3", "-b:a", "192k"])
+            }
+
+            for path, codec_opts in audio_tracks.values():
+                await run_ffmpeg(["ffmpeg", "-i", str(wav)] + codec_opts + [str(path)])
+
+            # Multiplex all tracks
+            def mux_cmd(video_opts: list) -> list:
+                cmd = ["ffmpeg", "-y", "-i", str(clip)]
+                for path, _ in audio_tracks.values():
+                    cmd.extend(["-i", str(path)])
+                return cmd + ["-map", "0:v:0", "-map", "1:a:0", "-map", "2:a:0", "-map", "3:a:0"] \
+                    + video_opts + ["-c:a", "copy", str(output_path)]
+
+            if copy_video:
+                try:
+                    await run_ffmpeg(mux_cmd(["-c:v", "copy"]))
+                    return
+                except HTTPException:
+                    pass  # muxer refused the copied stream, re-encode like any other codec
+            await run_ffmpeg(mux_cmd(["-c:v", "libx264", "-pix_fmt", "yuv420p"]))
 
 
 def count_tracks(input_path: Path) -> int:
-    """Count MP4 tracks"""
-    return input_path.read_bytes().count(b"trak")
+    """Count MP4 tracks (walks moov/trak box headers, never reads media data)"""
+    return len(parse_tracks(input_path))
 
 
-def add_macroblocks_visualization(input_path: Path, output_path: Path):
+@ffmpeg_op("macroblocks")
+async def add_macroblocks_visualization(input_path: Path, output_path: Path):
     """Visualize macroblocks and motion vectors"""
     cmd = ["ffmpeg", "-flags2", "+export_mvs", "-i", str(input_path),
            "-vf", "codecview=mv=pf+bf+bb", "-c:v", "libx264", str(output_path)]
-    run_ffmpeg(cmd)
+    await run_ffmpeg(cmd)
 
 
-def create_yuv_histogram(input_path: Path, output_path: Path):
+@ffmpeg_op("yuv_histogram")
+async def create_yuv_histogram(input_path: Path, output_path: Path):
     """Generate YUV histogram visualization"""
     cmd = ["ffmpeg", "-i", str(input_path),
            "-vf", "histogram=display_mode=stack,scale=1280:720,setsar=1",
            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-an", str(output_path)]
-    run_ffmpeg(cmd)
+    await run_ffmpeg(cmd)
 
 
 ###############################################################
@@ -130,33 +229,214 @@ CODEC_CONFIGS = {
 }
 
 
-def convert_codec(input_path: Path, format_id: int, output_path: Path):
+def video_encoder(format_id: int) -> str:
+    cmd = CODEC_CONFIGS[format_id]["cmd"]
+    return cmd[cmd.index("-c:v") + 1]
+
+
+def codec_command(format_id: int, tier: Optional[str] = None, bitrate: Optional[str] = None) -> list:
+    """Encoder arguments of a CODEC_CONFIGS entry at a speed tier (bitrate replaces its rate control)"""
+    cmd = list(CODEC_CONFIGS[format_id]["cmd"])
+    if bitrate:
+        kept = []
+        for flag, value in zip(cmd[::2], cmd[1::2]):
+            if flag not in ("-b:v", "-crf"):
+                kept += [flag, value]
+        cmd = kept + ["-b:v", bitrate]
+    return cmd + tier_options(video_encoder(format_id), check_tier(tier))
+
+
+async def clip_frames(input_path: Path, digest: Optional[str] = None) -> Tuple[int, int, float]:
+    """Width, height and frame count of the CLIP_SECONDS clip"""
+    info = await probes.probe(input_path, digest)
+    video = first_stream(info, "video") or {}
+    num, _, den = str(video.get("avg_frame_rate") or video.get("r_frame_rate") or "0/0").partition("/")
+    fps = float(num) / float(den) if den and float(den) else 25.0
+    seconds = min(CLIP_SECONDS, duration(info) or CLIP_SECONDS)
+    return video.get("width", 0), video.get("height", 0), fps * seconds
+
+
+async def clip_megapixels(input_path: Path, digest: Optional[str] = None) -> float:
+    """Pixels (in millions) the encoder has to process for the CLIP_SECONDS clip"""
+    width, height, frames = await clip_frames(input_path, digest)
+    return width * height * frames / 1e6
+
+
+def check_tier_request(tier: Optional[str], deadline: Optional[float]):
+    """400 for a bad tier/deadline combination (before any work is queued)"""
+    if tier is not None and deadline is not None:
+        raise HTTPException(status_code=400, detail="Pass either tier or deadline")
+    if deadline is None:
+        check_tier(tier)
+    elif deadline <= 0:
+        raise HTTPException(status_code=400, detail="deadline must be positive")
+
+
+def pick_tier(work: list, tier: Optional[str], deadline: Optional[float]) -> Tuple[str, Optional[float]]:
+    """Requested tier, or the slowest one expected to finish (encoder, megapixels) work within `deadline`"""
+    check_tier_request(tier, deadline)
+    if deadline is None:
+        tier = check_tier(tier)
+        return tier, speeds.estimate_total(work, tier)
+    return speeds.pick(work, deadline)
+
+
+async def choose_tier(input_path: Path, format_id: int, tier: Optional[str] = None,
+                      deadline: Optional[float] = None, digest: Optional[str] = None) -> Tuple[str, Optional[float]]:
+    """Tier for a conversion plus its time estimate"""
+    if format_id not in CODEC_CONFIGS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    check_tier_request(tier, deadline)
+    work = [(video_encoder(format_id), await clip_megapixels(input_path, digest))]
+    return pick_tier(work, tier, deadline)
+
+
+async def choose_ladder_tier(input_path: Path, specs: list, tier: Optional[str] = None,
+                             deadline: Optional[float] = None, digest: Optional[str] = None) -> Tuple[str, Optional[float]]:
+    """Tier for a whole ladder: the rungs' estimates add up"""
+    check_tier_request(tier, deadline)
+    _, _, frames = await clip_frames(input_path, digest)
+    work = [(video_encoder(codec), width * height * frames / 1e6) for _, width, height, codec, _ in specs]
+    return pick_tier(work, tier, deadline)
+
+
+@ffmpeg_op("convert")
+async def convert_codec(input_path: Path, format_id: int, output_path: Path,
+                        digest: Optional[str] = None, tier: Optional[str] = None):
     """Convert video to specified codec"""
-    with temp_workspace() as td:
-        clip = td / "clip20.mp4"
-        run_ffmpeg(["ffmpeg", "-i", str(input_path), "-ss", "00:00", "-to", "00:20", str(clip)])
-        
-        config = CODEC_CONFIGS.get(format_id)
-        if not config:
-            raise HTTPException(status_code=400, detail="Invalid format")
-        
-        cmd = ["ffmpeg", "-y", "-i", str(clip)] + config["cmd"] + [str(output_path)]
-        run_ffmpeg(cmd)
-
-
-def create_encoding_ladder(input_path: Path, output_dir: Path):
-    """Generate multi-resolution encoding ladder"""
-    ladder_specs = [
-        ("360p_vp9.webm", 640, 360, 0),
-        ("540p_vp8.webm", 960, 540, 1),
-        ("720p_h265.mp4", 1280, 720, 2),
-        ("1080p_av1.mp4", 1920, 1080, 3)
-    ]
-    
-    for filename, width, height, codec in ladder_specs:
-        scaled = output_dir / f"scaled_{width}x{height}.mp4"
-        resize_video(input_path, width, height, scaled)
-        convert_codec(scaled, codec, output_dir / filename)
+    config = CODEC_CONFIGS.get(format_id)
+    if not config:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    tier = check_tier(tier)
+
+    async with trimmed_clip(input_path, digest, duration=CLIP_SECONDS) as clip:
+        cmd = ["ffmpeg", "-y", "-i", str(clip)] + codec_command(format_id, tier) + [str(output_path)]
+        result = await run_ffmpeg(cmd)
+    # Measured throughput feeds the deadline -> tier estimates (encode time only, not the wait for a slot)
+    speeds.record(video_encoder(format_id), tier, await clip_megapixels(input_path, digest),
+                  result.wall_seconds)
+
+
+# Ladder rungs: output filename, width, height, CODEC_CONFIGS id, video bitrate (None = the config's own)
+LADDER_SPECS = [
+    ("360p_vp9.webm", 640, 360, 0, None),
+    ("540p_vp8.webm", 960, 540, 1, None),
+    ("720p_h265.mp4", 1280, 720, 2, None),
+    ("1080p_av1.mp4", 1920, 1080, 3, None)
+]
+
+# Per-title ladder candidates: short side (height, or width for portrait sources), CODEC_CONFIGS id,
+# short codec name, kbps for content of average complexity
+LADDER_CANDIDATES = [
+    (360, 0, "vp9", 800),
+    (540, 1, "vp8", 1500),
+    (720, 2, "h265", 2500),
+    (1080, 3, "av1", 4500)
+]
+
+# Complexity score upper bounds for 2 and 3 rungs (above: every candidate)
+LADDER_RUNG_SCORES = (0.3, 0.6)
+
+# Largest short side for sources below the first score: simple content gains little from a top rung
+# with the slowest codec (1080p AV1), so the ladder stops at 720p H.265
+LADDER_SIMPLE_MAX = 720
+
+
+def plan_ladder(analysis: dict) -> list:
+    """Rungs for a source: fewer and cheaper for simple content, never above the source resolution
+
+    The lowest and highest fitting candidates are kept and simpler sources drop the middle ones;
+    the simplest ones also stop at LADDER_SIMPLE_MAX. Resolutions compare the short side, so portrait
+    sources get the same rungs as landscape ones.
+    Bitrates scale from 0.5x (static, flat) to 1.5x (detailed, high motion) of the reference.
+    """
+    source = analysis["source"]
+    portrait = source["width"] < source["height"]
+    short, long = sorted((source["width"], source["height"]))
+    candidates = [c for c in LADDER_CANDIDATES if c[0] <= short] or LADDER_CANDIDATES[:1]
+    score = analysis["score"]
+    if score < LADDER_RUNG_SCORES[0]:
+        candidates = [c for c in candidates if c[0] <= LADDER_SIMPLE_MAX] or candidates[:1]
+    count = 2 if score < LADDER_RUNG_SCORES[0] else 3 if score < LADDER_RUNG_SCORES[1] else len(candidates)
+    count = min(count, len(candidates))
+    if count == 1:
+        chosen = [candidates[-1]]
+    else:
+        chosen = [candidates[round(i * (len(candidates) - 1) / (count - 1))] for i in range(count)]
+
+    factor = 0.5 + score
+    specs = []
+    for side, codec, name, kbps in chosen:
+        other = int(round(side * long / short / 2)) * 2
+        width, height = (side, other) if portrait else (other, side)
+        filename = f"{side}p_{name}.{CODEC_CONFIGS[codec]['ext']}"
+        specs.append((filename, width, height, codec, f"{int(kbps * factor)}k"))
+    return specs
+
+
+def ladder_plan_dict(analysis: dict, specs: list) -> dict:
+    return {"complexity": analysis,
+            "rungs": [{"name": f, "width": w, "height": h, "codec": video_encoder(c), "bitrate": b}
+                      for f, w, h, c, b in specs]}
+
+# "split": one ffmpeg process decodes once and fans out with a split filter graph
+# "parallel": one ffmpeg process per rung, all running at the same time
+LADDER_MODE = os.environ.get("LADDER_MODE", "split")
+
+
+def build_ladder_cmd(input_path: Path, output_dir: Path, specs: list, tier: Optional[str] = None) -> list:
+    """Single FFmpeg command: decode once, split, scale and encode every rung"""
+    graph = f"[0:v]split={len(specs)}" + "".join(f"[v{i}]" for i in range(len(specs)))
+    for i, (_, width, height, *_) in enumerate(specs):
+        graph += f";[v{i}]scale={width}:{height}[out{i}]"
+
+    # -t before -i trims on the input side, no intermediate clip is written
+    cmd = ["ffmpeg", "-y", "-t", str(CLIP_SECONDS), "-i", str(input_path),
+           "-filter_complex", graph]
+    for i, (filename, _, _, codec, bitrate) in enumerate(specs):
+        cmd += ["-map", f"[out{i}]", "-map", "0:a?"] + codec_command(codec, tier, bitrate)
+        cmd.append(str(output_dir / filename))
+    return cmd
+
+
+def build_rung_cmd(input_path: Path, output_dir: Path, spec: tuple, tier: Optional[str] = None) -> list:
+    """FFmpeg command for a single rung, scaling inside the same process"""
+    filename, width, height, codec, bitrate = spec
+    return (["ffmpeg", "-y", "-t", str(CLIP_SECONDS), "-i", str(input_path),
+             "-vf", f"scale={width}:{height}", "-map", "0:v:0", "-map", "0:a?"]
+            + codec_command(codec, tier, bitrate) + [str(output_dir / filename)])
+
+
+@ffmpeg_op("ladder")
+async def create_encoding_ladder(input_path: Path, output_dir: Path,
+                                 specs: Optional[list] = None, mode: Optional[str] = None,
+                                 tier: Optional[str] = None) -> list:
+    """Generate multi-resolution encoding ladder without intermediate scaled files"""
+    specs = specs or LADDER_SPECS
+    mode = mode or LADDER_MODE
+
+    if mode == "parallel":
+        # Each rung decodes on its own but they run concurrently (bounded by the runner pool)
+        await asyncio.gather(*(run_ffmpeg(build_rung_cmd(input_path, output_dir, spec, tier))
+                               for spec in specs))
+    else:
+        await run_ffmpeg(build_ladder_cmd(input_path, output_dir, specs, tier))
+
+    return [output_dir / filename for filename, *_ in specs]
+
+
+async def per_title_ladder(input_path: Path, digest: Optional[str] = None) -> Tuple[list, dict]:
+    """Analyse the clip and plan its ladder: (specs for create_encoding_ladder, JSON plan)"""
+    analysis = await analyse(input_path, digest, seconds=CLIP_SECONDS)
+    specs = plan_ladder(analysis)
+    return specs, ladder_plan_dict(analysis, specs)
+
+
+async def ladder_specs(input_path: Path, digest: str, adaptive: bool) -> Tuple[list, Optional[dict]]:
+    """Per-title plan, or the fixed LADDER_SPECS"""
+    if adaptive:
+        return await per_title_ladder(input_path, digest)
+    return LADDER_SPECS, None
 
 
 ###############################################################
@@ -169,86 +449,308 @@ def root():
 
 
 @app.get("/ffmpeg/version")
-def ffmpeg_version():
-    result = run_ffmpeg(["ffmpeg", "-version"], check=False)
+async def ffmpeg_version():
+    result = await run_ffmpeg(["ffmpeg", "-version"], check=False)
     return {"version": result.stdout.split("\n")[0]}
 
 
 @app.post("/video/resize", response_class=FileResponse)
-async def api_resize(file: UploadFile = File(...), width: int = 640, height: int = 360):
-    with temp_workspace() as td:
-        input_path = await save_upload(file, td)
+async def api_resize(file: UploadFile = File(...), width: int = 640, height: int = 360,
+                     stream: bool = False, container: str = "mp4"):
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+        if stream:
+            return await stream_filter(input_path, f"scale={width}:{height}", container, release_after(td))
         output_path = td / "resized.mp4"
-        resize_video(input_path, width, height, output_path)
-        return FileResponse(output_path, media_type="video/mp4")
+        output_path = await cache.fetch(
+            digest, "resize", {"width": width, "height": height}, output_path,
+            lambda: resize_video(input_path, width, height, output_path))
+        return FileResponse(output_path, media_type="video/mp4", background=release_after(td, output_path))
 
 
 @app.post("/video/chroma", response_class=FileResponse)
-async def api_chroma(file: UploadFile = File(...)):
-    with temp_workspace() as td:
-        input_path = await save_upload(file, td)
+async def api_chroma(file: UploadFile = File(...), stream: bool = False, container: str = "mp4"):
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+        if stream:
+            return await stream_filter(input_path, "format=yuv422p", container, release_after(td))
         output_path = td / "chroma.mp4"
-        chroma_subsampling(input_path, output_path)
-        return FileResponse(output_path, media_type="video/mp4")
+        output_path = await cache.fetch(
+            digest, "chroma", {}, output_path,
+            lambda: chroma_subsampling(input_path, output_path))
+        return FileResponse(output_path, media_type="video/mp4", background=release_after(td, output_path))
 
 
 @app.post("/video/info", response_class=JSONResponse)
-async def api_info(file: UploadFile = File(...)):
+async def api_info(file: UploadFile = File(...), fast: bool = False):
     with temp_workspace() as td:
-        input_path = await save_upload(file, td)
-        return JSONResponse(content=get_video_info(input_path), media_type="application/json")
+        input_path, digest = await ingest_upload(file, td)
+        if fast:
+            # Box-header metadata straight from the MP4, ffprobe only for other containers
+            info = movie_info(input_path)
+            if info is not None:
+                return info
+        return JSONResponse(content=await get_video_info(input_path, digest), media_type="application/json")
 
 
 @app.post("/video/bbb-container", response_class=FileResponse)
 async def api_bbb(file: UploadFile = File(...)):
-    with temp_workspace() as td:
-        input_path = await save_upload(file, td)
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
         output_path = td / "bbb_final.mp4"
-        create_bbb_container(input_path, output_path)
-        return FileResponse(output_path, media_type="video/mp4")
+        await create_bbb_container(input_path, output_path, digest)
+        return FileResponse(output_path, media_type="video/mp4", background=release_after(td))
 
 
 @app.post("/video/tracks")
 async def api_tracks(file: UploadFile = File(...)):
     with temp_workspace() as td:
         input_path = await save_upload(file, td)
-        return {"tracks": count_tracks(input_path)}
+        tracks = parse_tracks(input_path)
+        return {"tracks": len(tracks), "details": tracks}
 
 
 @app.post("/video/macroblocks", response_class=FileResponse)
 async def api_macroblocks(file: UploadFile = File(...)):
-    with temp_workspace() as td:
+    with temp_workspace(keep=True) as td:
         input_path = await save_upload(file, td)
         output_path = td / "macroblocks.mp4"
-        add_macroblocks_visualization(input_path, output_path)
-        return FileResponse(output_path, media_type="video/mp4")
+        await add_macroblocks_visualization(input_path, output_path)
+        return FileResponse(output_path, media_type="video/mp4", background=release_after(td))
 
 
 @app.post("/video/yuv-histogram", response_class=FileResponse)
 async def api_histogram(file: UploadFile = File(...)):
-    with temp_workspace() as td:
+    with temp_workspace(keep=True) as td:
         input_path = await save_upload(file, td)
         output_path = td / "histogram.mp4"
-        create_yuv_histogram(input_path, output_path)
-        return FileResponse(output_path, media_type="video/mp4")
+        await create_yuv_histogram(input_path, output_path)
+        return FileResponse(output_path, media_type="video/mp4", background=release_after(td))
+
+
+def tier_headers(tier: str, estimate: Optional[float]) -> dict:
+    headers = {"X-Speed-Tier": tier}
+    if estimate is not None:
+        headers["X-Estimated-Seconds"] = f"{estimate:.1f}"
+    return headers
 
 
 @app.post("/video/convert", response_class=FileResponse)
-async def api_convert(file: UploadFile = File(...), format: int = 0):
-    with temp_workspace() as td:
-        input_path = await save_upload(file, td)
+async def api_convert(file: UploadFile = File(...), format: int = 0,
+                      tier: Optional[str] = None, deadline: Optional[float] = None, quality: bool = False):
+    """tier: realtime | fast | balanced | archival; or deadline (seconds) to pick the tier automatically
+
+    quality: mean PSNR/SSIM against the source in X-PSNR / X-SSIM (per-frame scores: /jobs/convert)
+    """
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+        tier, estimate = await choose_tier(input_path, format, tier, deadline, digest)
         ext = CODEC_CONFIGS.get(format, {}).get("ext", "mp4")
         output_path = td / f"output.{ext}"
-        convert_codec(input_path, format, output_path)
-        return FileResponse(output_path)
+        output_path = await cache.fetch(
+            digest, "convert", {"format": format, "tier": tier}, output_path,
+            lambda: convert_codec(input_path, format, output_path, digest, tier))
+        headers = tier_headers(tier, estimate)
+        if quality:
+            try:
+                scores = await score_output(output_path, input_path, CLIP_SECONDS, reference_digest=digest)
+            except BaseException:
+                cache.release(output_path)
+                raise
+            headers["X-PSNR"] = str(scores["psnr"]["mean"])
+            headers["X-SSIM"] = str(scores["ssim"]["mean"])
+        return FileResponse(output_path, headers=headers, background=release_after(td, output_path))
 
 
 @app.post("/video/encoding-ladder")
-async def api_ladder(file: UploadFile = File(...)):
-    with temp_workspace() as td:
-        input_path = await save_upload(file, td)
-        create_encoding_ladder(input_path, td)
-        return {"message": "Encoding ladder completed", "folder": str(td)}
+async def api_ladder(file: UploadFile = File(...), tier: Optional[str] = None, deadline: Optional[float] = None,
+                     adaptive: bool = True, quality: bool = False):
+    """adaptive: rungs and bitrates from the source's complexity (False: the fixed LADDER_SPECS)
+    tier or deadline (seconds for all rungs): as in /video/convert
+    quality: PSNR/SSIM of every rung against the source, scored in parallel (opt-in, it decodes every
+    rung again; /jobs/encoding-ladder scores by default)
+    """
+    check_tier_request(tier, deadline)
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+        specs, plan = await ladder_specs(input_path, digest, adaptive)
+        tier, estimate = await choose_ladder_tier(input_path, specs, tier, deadline, digest)
+        outputs = await create_encoding_ladder(input_path, td, specs, tier=tier)
+        scores = await score_outputs(outputs, input_path, CLIP_SECONDS, reference_digest=digest) if quality else None
+        return {"message": "Encoding ladder completed", "folder": str(td), "tier": tier,
+                "estimated_seconds": estimate, "files": [p.name for p in outputs], "plan": plan,
+                "quality": scores}
+
+
+@app.get("/speed-tiers")
+def speed_tiers():
+    """Tier options per encoder and the throughput (megapixels/s) used for deadline estimates"""
+    return {"tiers": list(SPEED_TIERS), "options": TIER_OPTIONS, "throughput_mpps": speeds.stats()}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+
+@app.get("/scratch/stats")
+def scratch_stats():
+    return scratch.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+###############################################################
+# BACKGROUND JOBS (submit -> poll -> fetch)
+###############################################################
+
+def submit_job(kind: str, td: Path, run) -> JSONResponse:
+    """Queue a job (its workspace is pinned until it finishes) and answer 202"""
+    scratch.pin(td)
+
+    async def pinned(job: Job) -> list:
+        try:
+            return await run(job)
+        finally:
+            scratch.unpin(td)
+
+    job = queue.submit(kind, td, pinned)
+    return JSONResponse(status_code=202, content={
+        "job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"})
+
+
+async def clip_duration(input_path: Path, digest: Optional[str] = None) -> Optional[float]:
+    """Media seconds a CLIP_SECONDS job writes per ffmpeg step (drives job progress and ETA)"""
+    seconds = duration(await probes.probe(input_path, digest))
+    return min(CLIP_SECONDS, seconds) if seconds else CLIP_SECONDS
+
+
+@app.post("/jobs/convert")
+async def job_convert(file: UploadFile = File(...), format: int = 0,
+                      tier: Optional[str] = None, deadline: Optional[float] = None, quality: bool = True):
+    if format not in CODEC_CONFIGS:
+        raise HTTPException(status_code=400, detail="Invalid format")
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+        chosen, estimate = await choose_tier(input_path, format, tier, deadline, digest)
+
+    async def run(job: Job) -> list:
+        job.expected_duration = await clip_duration(input_path, digest)
+        job.result = {"tier": chosen, "estimated_seconds": estimate}
+        output_path = td / f"output.{CODEC_CONFIGS[format]['ext']}"
+        await convert_codec(input_path, format, output_path, digest, chosen)
+        if quality:
+            job.result["quality"] = await score_output(output_path, input_path, CLIP_SECONDS,
+                                                       reference_digest=digest)
+        return [output_path]
+
+    return submit_job("convert", td, run)
+
+
+@app.post("/jobs/bbb-container")
+async def job_bbb(file: UploadFile = File(...)):
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+
+    async def run(job: Job) -> list:
+        job.expected_duration = await clip_duration(input_path, digest)
+        output_path = td / "bbb_final.mp4"
+        await create_bbb_container(input_path, output_path, digest)
+        return [output_path]
+
+    return submit_job("bbb-container", td, run)
+
+
+@app.post("/jobs/encoding-ladder")
+async def job_ladder(file: UploadFile = File(...), tier: Optional[str] = None, deadline: Optional[float] = None,
+                     adaptive: bool = True, quality: bool = True):
+    check_tier_request(tier, deadline)
+    with temp_workspace(keep=True) as td:
+        input_path, digest = await ingest_upload(file, td)
+
+    async def run(job: Job) -> list:
+        job.expected_duration = await clip_duration(input_path, digest)
+        specs, plan = await ladder_specs(input_path, digest, adaptive)
+        chosen, estimate = await choose_ladder_tier(input_path, specs, tier, deadline, digest)
+        # The plan is visible while the rungs are still encoding
+        job.result = {"tier": chosen, "estimated_seconds": estimate, "plan": plan}
+        outputs = await create_encoding_ladder(input_path, td, specs, tier=chosen)
+        if quality:
+            job.result["quality"] = await score_outputs(outputs, input_path, CLIP_SECONDS, reference_digest=digest)
+        return outputs
+
+    return submit_job("encoding-ladder", td, run)
+
+
+@app.get("/jobs")
+def job_list(status: Optional[str] = None, stalled: Optional[bool] = None):
+    """Every known job (e.g. ?status=running&stalled=true to find stuck encodes)"""
+    jobs = [j.to_dict() for j in queue.jobs.values()]
+    if status is not None:
+        jobs = [j for j in jobs if j["status"] == status]
+    if stalled is not None:
+        jobs = [j for j in jobs if j["stalled"] == stalled]
+    return {"jobs": jobs}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return queue.get(job_id).to_dict()
+
+
+# Seconds between SSE comments when nothing changes (keeps proxies from closing the stream, re-checks stalls)
+JOB_EVENTS_HEARTBEAT = float(os.environ.get("JOB_EVENTS_HEARTBEAT", 10))
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: progress (frame, fps, speed, out_time, bitrate, ETA) until the job ends
+
+    Events: "progress" on every ffmpeg progress block, "stalled" once output time stops
+    moving for JOB_STALL_SECONDS, "done" with the final status (then the stream closes).
+    """
+    job = queue.get(job_id)
+
+    async def events():
+        version, stalled = -1, False
+        while True:
+            if await job.changed(version, JOB_EVENTS_HEARTBEAT):
+                version = job.version
+                yield sse("progress", job.to_dict())
+            else:
+                yield ": heartbeat\n\n"
+            if job.done:
+                yield sse("done", job.to_dict())
+                return
+            if job.stalled and not stalled:
+                yield sse("stalled", job.to_dict())
+            stalled = job.stalled
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/jobs/{job_id}/result", response_class=FileResponse)
+def job_result(job_id: str, name: Optional[str] = None):
+    job = queue.get(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if not job.done:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    path = job.output(name)
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Job output expired")
+    scratch.touch(job.workdir)
+    return FileResponse(path, filename=path.name)
 
 
 @app.get("/gui", response_class=HTMLResponse)
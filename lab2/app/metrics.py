@@ -0,0 +1,243 @@
+# Prometheus metrics: request latency per route, ffmpeg wall/CPU/RSS per operation and codec, byte counters
+# Text exposition format 0.0.4, no client library needed
+# From: https://prometheus.io/docs/instrumenting/exposition_formats/
+
+import contextvars
+import functools
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+###############################################################
+# METRIC TYPES
+###############################################################
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Iterable[float] = ()):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, list(c), self._sums[k]) for k, c in self._counts.items())
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {counts[-1]}")
+        return lines
+
+
+###############################################################
+# REGISTRY
+###############################################################
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RSS_BUCKETS = tuple(2 ** p * 1024 ** 2 for p in range(4, 14))  # 16 MiB .. 8 GiB
+
+http_latency = Histogram("http_request_duration_seconds", "Request latency by route",
+                         ("method", "route"), LATENCY_BUCKETS)
+http_requests = Counter("http_requests_total", "Requests by route and status", ("method", "route", "status"))
+http_in_flight = Gauge("http_requests_in_flight", "Requests being handled")
+http_response_bytes = Counter("http_response_bytes_total", "Response body bytes sent", ("route",))
+upload_bytes = Counter("upload_bytes_total", "Uploaded bytes written to scratch")
+
+ffmpeg_runs = Counter("ffmpeg_runs_total", "ffmpeg/ffprobe processes by outcome", ("op", "codec", "status"))
+ffmpeg_wall = Histogram("ffmpeg_wall_seconds", "ffmpeg/ffprobe wall time", ("op", "codec"), LATENCY_BUCKETS)
+ffmpeg_cpu = Counter("ffmpeg_cpu_seconds_total", "ffmpeg CPU time (from -benchmark)", ("op", "codec", "mode"))
+ffmpeg_rss = Histogram("ffmpeg_peak_rss_bytes", "ffmpeg peak resident set size (from -benchmark)",
+                       ("op", "codec"), RSS_BUCKETS)
+ffmpeg_in_flight = Gauge("ffmpeg_processes_in_flight", "ffmpeg/ffprobe processes running", ("op",))
+
+REGISTRY = [http_latency, http_requests, http_in_flight, http_response_bytes, upload_bytes,
+            ffmpeg_runs, ffmpeg_wall, ffmpeg_cpu, ffmpeg_rss, ffmpeg_in_flight]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+###############################################################
+# FFMPEG ACCOUNTING
+###############################################################
+
+# Operation name of the code currently running ffmpeg (set with @ffmpeg_op)
+_op = contextvars.ContextVar("ffmpeg_op", default="other")
+
+CODEC_FLAGS = ("-c:v", "-vcodec", "-codec:v", "-c", "-codec")
+BENCH_TIMES = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s")
+BENCH_RSS = re.compile(r"bench: maxrss=(\d+)(KiB|kB)")
+
+
+def ffmpeg_op(name: str):
+    """Label every ffmpeg run inside the decorated coroutine with op=name"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _op.set(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _op.reset(token)
+        return wrapper
+    return decorator
+
+
+def command_labels(cmd: list) -> Dict[str, str]:
+    """op from the context, codec from the encoder arguments ("default" when ffmpeg picks, "ffprobe" for probes)"""
+    codecs = []
+    for flag, value in zip(cmd, cmd[1:]):
+        if flag in CODEC_FLAGS and value not in codecs:
+            codecs.append(value)
+    if str(cmd[0]).rsplit("/", 1)[-1] == "ffprobe":
+        codecs = ["ffprobe"]
+    return {"op": _op.get(), "codec": "+".join(codecs) or "default"}
+
+
+def with_benchmark(cmd: list) -> list:
+    """ffmpeg prints its own utime/stime/maxrss at exit with -benchmark (ffprobe has no equivalent)"""
+    if str(cmd[0]).rsplit("/", 1)[-1] == "ffmpeg" and "-benchmark" not in cmd:
+        return [cmd[0], "-benchmark"] + list(cmd[1:])
+    return cmd
+
+
+class FFmpegRun:
+    """Accounting for one process: in-flight gauge while it runs, wall/CPU/RSS once it exits"""
+
+    def __init__(self, cmd: list):
+        self.labels = command_labels(cmd)
+        self.start = time.perf_counter()
+        ffmpeg_in_flight.inc(op=self.labels["op"])
+
+    def finish(self, returncode: Optional[int], stderr: str = ""):
+        self.wall = time.perf_counter() - self.start
+        ffmpeg_in_flight.dec(op=self.labels["op"])
+        status = "ok" if returncode == 0 else ("killed" if returncode is None or returncode < 0 else "error")
+        ffmpeg_runs.inc(status=status, **self.labels)
+        ffmpeg_wall.observe(self.wall, **self.labels)
+        times = BENCH_TIMES.search(stderr)
+        if times:
+            ffmpeg_cpu.inc(float(times.group(1)), mode="user", **self.labels)
+            ffmpeg_cpu.inc(float(times.group(2)), mode="system", **self.labels)
+        rss = BENCH_RSS.search(stderr)
+        if rss:
+            ffmpeg_rss.observe(int(rss.group(1)) * 1024, **self.labels)
+
+
+###############################################################
+# HTTP MIDDLEWARE
+###############################################################
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request and counting the body bytes it sends"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            http_in_flight.dec()
+            # Route template (/jobs/{job_id}) rather than the raw path keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_latency.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=str(state["status"]))
+            http_response_bytes.inc(state["bytes"], route=route)
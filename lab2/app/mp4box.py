@@ -0,0 +1,155 @@
+# Minimal ISO-BMFF (MP4/MOV) box parser
+# Walks box headers only (mdat is skipped by its size), so the cost does not depend on the media size
+# Box layouts from: ISO/IEC 14496-12 (https://mpeggroup.github.io/FileFormatConformance/)
+
+import mmap
+import struct
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+
+HANDLERS = {b"vide": "video", b"soun": "audio", b"subt": "subtitle", b"text": "subtitle",
+            b"sbtl": "subtitle", b"hint": "hint", b"meta": "metadata", b"tmcd": "timecode"}
+
+
+###############################################################
+# BOX WALKING
+###############################################################
+
+def iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload_start, box_end) for every box in buf[start:end]"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:                       # 64-bit largesize follows the type
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:                     # box extends to the end of its parent
+            size = end - pos
+        if size < header or pos + size > end:
+            return                          # truncated or corrupt, stop here
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def find_box(buf, start: int, end: int, path: str) -> Optional[Tuple[int, int]]:
+    """Follow a box path like 'mdia/minf/stbl' and return (payload_start, box_end)"""
+    for kind in path.encode().split(b"/"):
+        for box_kind, payload, box_end in iter_boxes(buf, start, end):
+            if box_kind == kind:
+                start, end = payload, box_end
+                break
+        else:
+            return None
+    return start, end
+
+
+###############################################################
+# FULL BOX FIELDS
+###############################################################
+
+def _times(buf, payload: int) -> Tuple[int, int, int]:
+    """(version, timescale, duration) from an mvhd/mdhd payload"""
+    version = buf[payload]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, payload + 4 + 16)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, payload + 4 + 8)
+    return version, timescale, duration
+
+
+def _track_header(buf, payload: int) -> Tuple[int, float, float]:
+    """(track_id, width, height) from a tkhd payload"""
+    version = buf[payload]
+    track_id = struct.unpack_from(">I", buf, payload + (20 if version == 1 else 12))[0]
+    width, height = struct.unpack_from(">II", buf, payload + (88 if version == 1 else 76))
+    return track_id, width / 65536, height / 65536
+
+
+def _sample_count(buf, stbl: Tuple[int, int]) -> int:
+    stsz = find_box(buf, *stbl, "stsz")
+    if stsz:
+        return struct.unpack_from(">I", buf, stsz[0] + 8)[0]
+    stz2 = find_box(buf, *stbl, "stz2")
+    if stz2:
+        return struct.unpack_from(">I", buf, stz2[0] + 8)[0]
+    return 0
+
+
+def _track(buf, start: int, end: int) -> dict:
+    """Describe one trak box"""
+    info = {"id": None, "type": "unknown", "codec": None, "timescale": None,
+            "duration": None, "samples": 0}
+
+    tkhd = find_box(buf, start, end, "tkhd")
+    if tkhd:
+        info["id"], width, height = _track_header(buf, tkhd[0])
+
+    mdia = find_box(buf, start, end, "mdia")
+    if mdia is None:
+        return info
+
+    mdhd = find_box(buf, *mdia, "mdhd")
+    if mdhd:
+        _, timescale, duration = _times(buf, mdhd[0])
+        info["timescale"] = timescale
+        info["duration"] = duration / timescale if timescale else None
+
+    hdlr = find_box(buf, *mdia, "hdlr")
+    if hdlr:
+        handler = bytes(buf[hdlr[0] + 8:hdlr[0] + 12])
+        info["type"] = HANDLERS.get(handler, handler.decode("latin-1"))
+    if info["type"] == "video" and tkhd:
+        info["width"], info["height"] = round(width), round(height)
+
+    stbl = find_box(buf, *mdia, "minf/stbl")
+    if stbl:
+        stsd = find_box(buf, *stbl, "stsd")
+        if stsd and stsd[0] + 16 <= stsd[1]:
+            # first sample entry: size(4) + format(4) right after version/flags/entry_count
+            info["codec"] = bytes(buf[stsd[0] + 12:stsd[0] + 16]).decode("latin-1")
+        info["samples"] = _sample_count(buf, stbl)
+    return info
+
+
+###############################################################
+# PUBLIC API
+###############################################################
+
+def _parse(buf, size: int) -> Optional[dict]:
+    moov = find_box(buf, 0, size, "moov")
+    if moov is None:
+        return None
+
+    result = {"brand": None, "duration": None, "tracks": []}
+    ftyp = find_box(buf, 0, size, "ftyp")
+    if ftyp:
+        result["brand"] = bytes(buf[ftyp[0]:ftyp[0] + 4]).decode("latin-1")
+
+    mvhd = find_box(buf, *moov, "mvhd")
+    if mvhd:
+        _, timescale, duration = _times(buf, mvhd[0])
+        result["duration"] = duration / timescale if timescale else None
+
+    result["tracks"] = [_track(buf, payload, end)
+                        for kind, payload, end in iter_boxes(buf, *moov) if kind == b"trak"]
+    return result
+
+
+def movie_info(path: Path) -> Optional[dict]:
+    """Brand, duration and per-track info of an MP4, or None if it is not ISO-BMFF"""
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse(mm, size)
+
+
+def parse_tracks(path: Path) -> List[dict]:
+    """Per-track type, codec, duration and sample count (empty if not ISO-BMFF)"""
+    info = movie_info(path)
+    return info["tracks"] if info else []
@@ -0,0 +1,90 @@
+# ffprobe metadata index: every distinct input (by content hash) is probed once
+# Results are kept in a local SQLite file so they survive restarts
+# From: https://docs.python.org/3/library/sqlite3.html
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.cache import file_sha256
+from app.metrics import ffmpeg_op
+from app.runner import run_ffmpeg
+
+
+PROBE_INDEX = Path(os.environ.get("PROBE_INDEX", Path(tempfile.gettempdir()) / "probe_index.sqlite3"))
+
+
+class ProbeIndex:
+    """content hash -> parsed `ffprobe -show_format -show_streams` JSON"""
+
+    def __init__(self, db_path: Path = PROBE_INDEX):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS probes ("
+                           "hash TEXT PRIMARY KEY, info TEXT NOT NULL, probed_at REAL NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def lookup(self, digest: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT info FROM probes WHERE hash = ?", (digest,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store(self, digest: str, info: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?)",
+                               (digest, json.dumps(info), time.time()))
+            self._conn.commit()
+
+    @ffmpeg_op("probe")
+    async def _run_probe(self, input_path: Path, digest: str) -> dict:
+        cmd = ["ffprobe", "-v", "quiet", "-print_format", "json",
+               "-show_format", "-show_streams", str(input_path)]
+        info = json.loads((await run_ffmpeg(cmd)).stdout or "{}")
+        self.store(digest, info)
+        return info
+
+    async def probe(self, input_path: Path, digest: Optional[str] = None) -> dict:
+        """Metadata of input_path, spawning ffprobe only the first time its content is seen"""
+        if digest is None:
+            digest = await asyncio.to_thread(file_sha256, input_path)
+        info = self.lookup(digest)
+        if info is not None:
+            return info
+
+        # Concurrent requests for the same new input share one ffprobe
+        task = self._inflight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._run_probe(input_path, digest))
+            self._inflight[digest] = task
+            task.add_done_callback(lambda _: self._inflight.pop(digest, None))
+        return await asyncio.shield(task)
+
+
+###############################################################
+# HELPERS ON PROBE RESULTS
+###############################################################
+
+def first_stream(info: dict, codec_type: str) -> Optional[dict]:
+    """First 'video' / 'audio' stream of a probe result"""
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+
+def duration(info: dict) -> Optional[float]:
+    """Container duration in seconds"""
+    value = info.get("format", {}).get("duration")
+    return float(value) if value else None
+
+
+probes = ProbeIndex()
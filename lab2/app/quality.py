@@ -0,0 +1,101 @@
+# Objective quality of encoded outputs against their source: PSNR and SSIM from ffmpeg's psnr/ssim filters
+# Only every QUALITY_FRAME_STEP-th frame is compared; distorted frames are scaled to the reference size.
+# Per-frame values come from the filters' stats_file, every output is scored concurrently.
+# From: https://ffmpeg.org/ffmpeg-filters.html#psnr, https://ffmpeg.org/ffmpeg-filters.html#ssim
+
+import asyncio
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.metrics import ffmpeg_op
+from app.probe import first_stream, probes
+from app.runner import run_ffmpeg
+from app.scratch import scratch
+
+
+# Compare one frame out of this many (decoding still reads them all, the metrics are what costs)
+QUALITY_FRAME_STEP = int(os.environ.get("QUALITY_FRAME_STEP", 10))
+
+
+def _filter_path(path: Path) -> str:
+    """Escape a path for use as a filter option value"""
+    return str(path).replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
+
+
+def quality_graph(width: int, height: int, step: int, psnr_log: Path, ssim_log: Path) -> str:
+    """[0] distorted, [1] reference -> same frames, same size -> psnr + ssim"""
+    # Both sides restart at pts 0 so psnr/ssim pair frame i with frame i
+    select = f"setpts=PTS-STARTPTS,select=not(mod(n\\,{step}))"
+    return (f"[0:v]{select},scale={width}:{height}:flags=bicubic,format=yuv420p,split[d1][d2];"
+            f"[1:v]{select},format=yuv420p,split[r1][r2];"
+            f"[d1][r1]psnr=stats_file={_filter_path(psnr_log)};"
+            f"[d2][r2]ssim=stats_file={_filter_path(ssim_log)}")
+
+
+def _stats_lines(path: Path) -> List[Dict[str, str]]:
+    """key:value pairs of every line of a psnr/ssim stats file"""
+    rows = []
+    for line in path.read_text().splitlines():
+        pairs = (item.split(":", 1) for item in line.split() if ":" in item)
+        rows.append({k: v for k, v in pairs})
+    return rows
+
+
+def _value(text: Optional[str]) -> Optional[float]:
+    if text is None:
+        return None
+    value = float(text)  # "inf" for identical frames
+    return None if math.isnan(value) else value
+
+
+def _summary(values: List[Optional[float]]) -> dict:
+    """Mean and worst frame; identical frames (inf PSNR) are left out"""
+    finite = [v for v in values if v is not None and not math.isinf(v)]
+    if not finite:
+        return {"mean": None, "min": None}
+    return {"mean": round(sum(finite) / len(finite), 4), "min": round(min(finite), 4)}
+
+
+def parse_quality(psnr_log: Path, ssim_log: Path, step: int) -> dict:
+    """Aggregate and per-frame scores (frame = index in the source)"""
+    psnr = [_value(row.get("psnr_avg")) for row in _stats_lines(psnr_log)]
+    ssim = [_value(row.get("All")) for row in _stats_lines(ssim_log)]
+    frames = [{"frame": i * step,
+               "psnr": round(p, 4) if p is not None and not math.isinf(p) else None,
+               "ssim": round(s, 6) if s is not None else None}
+              for i, (p, s) in enumerate(zip(psnr, ssim))]
+    return {"psnr": _summary(psnr), "ssim": _summary(ssim), "compared_frames": len(frames),
+            "frame_step": step, "frames": frames}
+
+
+@ffmpeg_op("quality")
+async def score_output(distorted: Path, reference: Path, seconds: Optional[float] = None,
+                       step: int = QUALITY_FRAME_STEP, reference_digest: Optional[str] = None) -> dict:
+    """PSNR/SSIM of one encoded file against the first `seconds` of its reference"""
+    video = first_stream(await probes.probe(reference, reference_digest), "video")
+    if video is None or not video.get("width") or not video.get("height"):
+        raise HTTPException(status_code=400, detail="Reference has no video stream")
+
+    td = scratch.create(prefix="quality", intermediate=True)
+    try:
+        psnr_log, ssim_log = td / "psnr.log", td / "ssim.log"
+        trim = ["-t", str(seconds)] if seconds else []
+        cmd = (["ffmpeg", "-v", "error", "-i", str(distorted)] + trim + ["-i", str(reference),
+               "-lavfi", quality_graph(video["width"], video["height"], step, psnr_log, ssim_log),
+               "-f", "null", "-"])
+        await run_ffmpeg(cmd)
+        return parse_quality(psnr_log, ssim_log, step)
+    finally:
+        scratch.release(td)
+
+
+async def score_outputs(outputs: List[Path], reference: Path, seconds: Optional[float] = None,
+                        step: int = QUALITY_FRAME_STEP, reference_digest: Optional[str] = None) -> dict:
+    """Score every output at the same time (bounded by the runner's process pool): name -> scores"""
+    results = await asyncio.gather(*(score_output(p, reference, seconds, step, reference_digest)
+                                     for p in outputs))
+    return {p.name: r for p, r in zip(outputs, results)}
@@ -0,0 +1,213 @@
+# Asyncio FFmpeg runner shared by the merge_main endpoints
+# From: https://docs.python.org/3/library/asyncio-subprocess.html
+
+import asyncio
+import contextvars
+import os
+import subprocess
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import HTTPException
+
+from app.metrics import FFmpegRun, with_benchmark
+
+
+###############################################################
+# CONCURRENCY POOL
+###############################################################
+
+# Max number of ffmpeg/ffprobe processes running at once in this worker
+FFMPEG_MAX_PROCS = int(os.environ.get("FFMPEG_MAX_PROCS", os.cpu_count() or 2))
+
+_slots = asyncio.Semaphore(FFMPEG_MAX_PROCS)
+
+
+def set_max_processes(limit: int):
+    """Change the process limit (only safe while nothing is running)"""
+    global FFMPEG_MAX_PROCS, _slots
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    FFMPEG_MAX_PROCS = limit
+    _slots = asyncio.Semaphore(limit)
+
+
+async def _kill(proc: asyncio.subprocess.Process):
+    """Kill a child process and reap it"""
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+###############################################################
+# PROGRESS (ffmpeg -progress pipe:1 writes key=value blocks ending in progress=continue|end)
+# From: https://ffmpeg.org/ffmpeg.html#Advanced-options
+###############################################################
+
+# Callback receiving one dict per progress block of every ffmpeg run in the current context (set by the job queue)
+progress_sink: contextvars.ContextVar[Optional[Callable[[dict], None]]] = \
+    contextvars.ContextVar("progress_sink", default=None)
+
+
+def with_progress(cmd: list) -> list:
+    """Ask ffmpeg for machine-readable progress on stdout (not when stdout already carries the output)"""
+    if str(cmd[0]).rsplit("/", 1)[-1] != "ffmpeg" or "-progress" in cmd:
+        return cmd
+    if any(str(arg) in ("-", "pipe:", "pipe:1") for arg in cmd[1:]):
+        return cmd
+    return [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+
+
+def _number(value: Optional[str], cast=float, suffix: str = ""):
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return cast(value)
+    except ValueError:
+        return None  # "N/A" until ffmpeg knows the value
+
+
+def parse_progress(block: dict) -> dict:
+    """Typed view of one -progress block"""
+    # out_time_ms is in microseconds too (long-standing ffmpeg quirk), prefer out_time_us
+    out_time_us = _number(block.get("out_time_us") or block.get("out_time_ms"), int)
+    return {
+        "frame": _number(block.get("frame"), int),
+        "fps": _number(block.get("fps")),
+        "speed": _number(block.get("speed"), suffix="x"),
+        "out_time": out_time_us / 1e6 if out_time_us is not None and out_time_us >= 0 else None,
+        "bitrate_kbps": _number(block.get("bitrate"), suffix="kbits/s"),
+        "total_size": _number(block.get("total_size"), int),
+        "progress": block.get("progress", "continue"),
+    }
+
+
+async def _read_progress(stdout: asyncio.StreamReader, sink: Callable[[dict], None], run_id: int) -> bytes:
+    """Feed every progress block to the sink; lines that are not key=value are returned as plain stdout"""
+    block, other = {}, []
+    async for raw in stdout:
+        key, sep, value = raw.decode(errors="replace").strip().partition("=")
+        if not sep:
+            other.append(raw)
+            continue
+        block[key] = value
+        if key == "progress":
+            sink({"run": run_id, **parse_progress(block)})
+            block = {}
+    return b"".join(other)
+
+
+###############################################################
+# RUNNER
+###############################################################
+
+class FFmpegResult(subprocess.CompletedProcess):
+    """CompletedProcess plus how long the process ran (time spent waiting for a slot not included)"""
+
+    def __init__(self, args, returncode, stdout, stderr, wall_seconds: float):
+        super().__init__(args, returncode, stdout, stderr)
+        self.wall_seconds = wall_seconds
+
+
+async def run_ffmpeg(cmd: list, check: bool = True) -> FFmpegResult:
+    """Unified FFmpeg command runner with error handling (non-blocking)
+
+    Inside a job (progress_sink set) ffmpeg runs with -progress and every block is
+    passed to the sink while the process is still running.
+    """
+    sink = progress_sink.get()
+    exec_cmd = with_progress(cmd) if sink is not None else cmd
+    if exec_cmd is cmd:
+        sink = None
+    async with _slots:
+        run = FFmpegRun(cmd)
+        proc = await asyncio.create_subprocess_exec(
+            *with_benchmark(exec_cmd), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            if sink is None:
+                stdout, stderr = await proc.communicate()
+            else:
+                sink({"run": proc.pid, "progress": "start"})
+                # Drain stderr in the background so ffmpeg never blocks on a full pipe
+                errors = asyncio.create_task(proc.stderr.read())
+                try:
+                    stdout = await _read_progress(proc.stdout, sink, proc.pid)
+                    stderr = await errors
+                    await proc.wait()
+                finally:
+                    errors.cancel()
+                    sink({"run": proc.pid, "progress": "exit"})
+        except BaseException:
+            # Request cancelled (client gone, shutdown...) -> don't leave ffmpeg running
+            await _kill(proc)
+            run.finish(None)
+            raise
+        run.finish(proc.returncode, stderr.decode(errors="replace"))
+
+    result = FFmpegResult(
+        cmd, proc.returncode,
+        stdout.decode(errors="replace"), stderr.decode(errors="replace"), run.wall)
+    if check and result.returncode != 0:
+        raise HTTPException(status_code=500, detail=f"FFmpeg error: {result.stderr}")
+    return result
+
+
+###############################################################
+# STREAMING (ffmpeg writes to pipe:1, bytes go straight to the client)
+###############################################################
+
+STREAM_CHUNK = 64 * 1024
+
+
+async def _stream(cmd: list, chunk_size: int) -> AsyncIterator[bytes]:
+    async with _slots:
+        run = FFmpegRun(cmd)
+        proc = await asyncio.create_subprocess_exec(
+            *with_benchmark(cmd), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        # Drain stderr in the background so ffmpeg never blocks on a full pipe
+        stderr = asyncio.create_task(proc.stderr.read())
+        try:
+            first = await proc.stdout.read(chunk_size)
+            if not first:
+                await proc.wait()
+                if proc.returncode != 0:
+                    detail = (await stderr).decode(errors="replace")
+                    raise HTTPException(status_code=500, detail=f"FFmpeg error: {detail}")
+            yield first
+            while chunk := await proc.stdout.read(chunk_size):
+                yield chunk
+            await proc.wait()
+        finally:
+            # Normal end, client disconnect (cancel/aclose) or error: ffmpeg must not outlive us
+            exited = proc.returncode
+            await _kill(proc)
+            errors = ""
+            if stderr.done() and not stderr.cancelled() and stderr.exception() is None:
+                errors = stderr.result().decode(errors="replace")
+            stderr.cancel()
+            run.finish(exited, errors)
+
+
+async def stream_ffmpeg(cmd: list, chunk_size: int = STREAM_CHUNK) -> AsyncIterator[bytes]:
+    """Start ffmpeg and return an iterator over its stdout
+
+    Waits for the first chunk so that a command failing straight away raises
+    the same HTTPException as run_ffmpeg instead of sending an empty 200.
+    """
+    chunks = _stream(cmd, chunk_size)
+    first = await chunks.__anext__()
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return body()
@@ -0,0 +1,145 @@
+# Managed scratch space for uploads, intermediates and job outputs
+# Per-job directories under one root, global size quota, TTL + LRU eviction,
+# optional tmpfs root (e.g. /dev/shm) for short-lived intermediates
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+SCRATCH_DIR = Path(os.environ.get("SCRATCH_DIR", Path(tempfile.gettempdir()) / "video_scratch"))
+SCRATCH_TMPFS = os.environ.get("SCRATCH_TMPFS")  # unset = intermediates go to SCRATCH_DIR too
+SCRATCH_QUOTA_BYTES = int(os.environ.get("SCRATCH_QUOTA_BYTES", 20 * 1024 ** 3))
+SCRATCH_TTL = int(os.environ.get("SCRATCH_TTL", 3600))  # seconds since last use
+
+SWEEP_INTERVAL = 60
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class ScratchStore:
+    """Creates workspaces and evicts the old ones (pinned workspaces are never evicted)"""
+
+    def __init__(self, root: Path = SCRATCH_DIR, quota_bytes: int = SCRATCH_QUOTA_BYTES,
+                 ttl: int = SCRATCH_TTL, tmpfs: Optional[str] = SCRATCH_TMPFS):
+        self.root = Path(root)
+        self.tmpfs = Path(tmpfs) / "video_scratch" if tmpfs else None
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self.evicted = 0
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._sweeping = False
+        for root in self.roots:
+            root.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def roots(self) -> List[Path]:
+        return [self.root] + ([self.tmpfs] if self.tmpfs else [])
+
+    def create(self, prefix: str = "job", intermediate: bool = False) -> Path:
+        """New pinned workspace directory"""
+        self.maybe_sweep()
+        root = self.tmpfs if intermediate and self.tmpfs else self.root
+        # Created and pinned under the lock, so a concurrent sweep never sees it unpinned
+        with self._lock:
+            path = Path(tempfile.mkdtemp(prefix=f"{prefix}_", dir=root))
+            self._pinned.add(path)
+        return path
+
+    def pin(self, path: Path):
+        with self._lock:
+            self._pinned.add(Path(path))
+
+    def unpin(self, path: Path):
+        """Workspace no longer in use: it stays until TTL/quota eviction"""
+        with self._lock:
+            self._pinned.discard(Path(path))
+        self.touch(path)
+
+    def touch(self, path: Path):
+        """Mark a workspace as recently used"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def release(self, path: Path):
+        """Delete a workspace now"""
+        with self._lock:
+            self._pinned.discard(Path(path))
+        shutil.rmtree(path, ignore_errors=True)
+
+    def workspaces(self) -> List[Tuple[Path, int, float]]:
+        """(path, size, last_used) of every workspace, least recently used first"""
+        found = []
+        for root in self.roots:
+            for entry in os.scandir(root):
+                if entry.is_dir(follow_symlinks=False):
+                    path = Path(entry.path)
+                    found.append((path, dir_size(path), entry.stat().st_mtime))
+        return sorted(found, key=lambda w: w[2])
+
+    def maybe_sweep(self):
+        """Start a sweep in a background thread when one is due
+
+        create() is called from the event loop, and walking every workspace must not block it.
+        """
+        with self._lock:
+            if self._sweeping or time.time() - self._last_sweep < SWEEP_INTERVAL:
+                return
+            self._sweeping = True
+        threading.Thread(target=self._background_sweep, name="scratch-sweep", daemon=True).start()
+
+    def _background_sweep(self):
+        try:
+            self.sweep()
+        finally:
+            self._sweeping = False
+
+    def sweep(self) -> int:
+        """Evict expired workspaces, then least recently used ones until under quota"""
+        self._last_sweep = time.time()
+        workspaces = self.workspaces()
+        with self._lock:  # after listing: everything listed is pinned by now if it is in use
+            pinned = set(self._pinned)
+        total = sum(size for _, size, _ in workspaces)
+        removed = 0
+        for path, size, last_used in workspaces:
+            if path in pinned:
+                continue
+            if self._last_sweep - last_used > self.ttl or total > self.quota_bytes:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+        self.evicted += removed
+        return removed
+
+    def stats(self) -> dict:
+        workspaces = self.workspaces()
+        return {
+            "roots": [str(r) for r in self.roots],
+            "workspaces": len(workspaces),
+            "pinned": len(self._pinned),
+            "bytes": sum(size for _, size, _ in workspaces),
+            "quota_bytes": self.quota_bytes,
+            "ttl": self.ttl,
+            "evicted": self.evicted,
+        }
+
+
+scratch = ScratchStore()
@@ -0,0 +1,137 @@
+# Speed tiers for the CODEC_CONFIGS encoders: realtime -> fast -> balanced -> archival
+# Every tier maps to the encoder's own speed/quality knobs (preset, cpu-used, deadline) plus threading
+# (threads, row-mt, tiles), and a deadline picks a tier from measured encoder throughput.
+# From: https://trac.ffmpeg.org/wiki/Encode/VP9, https://trac.ffmpeg.org/wiki/Encode/AV1,
+#       https://trac.ffmpeg.org/wiki/Encode/H.265
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+# Fastest first
+SPEED_TIERS = ("realtime", "fast", "balanced", "archival")
+DEFAULT_TIER = os.environ.get("DEFAULT_SPEED_TIER", "balanced")
+
+# Encoder threads per ffmpeg process (tiles/row-mt only help if the encoder gets several threads)
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", os.cpu_count() or 1))
+
+
+def _vpx(deadline: str, cpu_used: int, tile_columns: int = 0, row_mt: bool = False) -> List[str]:
+    opts = ["-deadline", deadline, "-cpu-used", str(cpu_used), "-threads", str(ENCODER_THREADS)]
+    if tile_columns:
+        opts += ["-tile-columns", str(tile_columns)]
+    if row_mt:
+        opts += ["-row-mt", "1"]
+    return opts
+
+
+def _aom(cpu_used: int, tiles: str, realtime: bool = False) -> List[str]:
+    opts = ["-cpu-used", str(cpu_used), "-row-mt", "1", "-tiles", tiles, "-threads", str(ENCODER_THREADS)]
+    return (["-usage", "realtime"] if realtime else []) + opts
+
+
+TIER_OPTIONS: Dict[str, Dict[str, List[str]]] = {
+    # VP9: tile columns are log2, row-mt lets every tile use several threads
+    "libvpx-vp9": {
+        "realtime": _vpx("realtime", 8, 2, True),
+        "fast": _vpx("good", 5, 2, True),
+        "balanced": _vpx("good", 2, 1, True),
+        "archival": _vpx("good", 0, 0, True),
+    },
+    # VP8 has no tiles/row-mt, only cpu-used and slice threading
+    "libvpx": {
+        "realtime": _vpx("realtime", 8),
+        "fast": _vpx("good", 4),
+        "balanced": _vpx("good", 1),
+        "archival": _vpx("best", 0),
+    },
+    # x265 threads itself (frame threads + WPP); the presets are the speed knob
+    "libx265": {
+        "realtime": ["-preset", "ultrafast"],
+        "fast": ["-preset", "veryfast"],
+        "balanced": ["-preset", "medium"],
+        "archival": ["-preset", "slow"],
+    },
+    # libaom defaults to cpu-used 1 without row-mt or tiles, i.e. very slow
+    "libaom-av1": {
+        "realtime": _aom(8, "2x2", realtime=True),
+        "fast": _aom(6, "2x2"),
+        "balanced": _aom(4, "2x1"),
+        "archival": _aom(1, "1x1"),
+    },
+}
+
+# Starting throughput guesses in megapixels per second (1080p30 is ~62 MP/s), replaced by measurements
+SPEED_PRIOR_MPPS: Dict[str, Dict[str, float]] = {
+    "libvpx-vp9": {"realtime": 60, "fast": 25, "balanced": 8, "archival": 2},
+    "libvpx": {"realtime": 80, "fast": 40, "balanced": 15, "archival": 4},
+    "libx265": {"realtime": 80, "fast": 40, "balanced": 10, "archival": 4},
+    "libaom-av1": {"realtime": 30, "fast": 12, "balanced": 4, "archival": 0.5},
+}
+
+# Weight of the newest measurement in the moving average
+SPEED_EWMA_ALPHA = float(os.environ.get("SPEED_EWMA_ALPHA", 0.3))
+
+
+def check_tier(tier: Optional[str]) -> str:
+    tier = tier or DEFAULT_TIER
+    if tier not in SPEED_TIERS:
+        raise HTTPException(status_code=400, detail=f"Invalid tier, use one of: {', '.join(SPEED_TIERS)}")
+    return tier
+
+
+def tier_options(encoder: str, tier: str) -> List[str]:
+    """Extra encoder options of a tier (nothing for encoders without tiers)"""
+    return list(TIER_OPTIONS.get(encoder, {}).get(tier, []))
+
+
+class SpeedTable:
+    """Encoder throughput per (encoder, tier): prior guess, then an exponentially weighted moving average"""
+
+    def __init__(self, prior: Dict[str, Dict[str, float]] = SPEED_PRIOR_MPPS, alpha: float = SPEED_EWMA_ALPHA):
+        self.prior = prior
+        self.alpha = alpha
+        self._observed: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def throughput(self, encoder: str, tier: str) -> Optional[float]:
+        """Megapixels per second"""
+        with self._lock:
+            observed = self._observed.get((encoder, tier))
+        return observed if observed is not None else self.prior.get(encoder, {}).get(tier)
+
+    def record(self, encoder: str, tier: str, megapixels: float, seconds: float):
+        if megapixels <= 0 or seconds <= 0:
+            return
+        speed = megapixels / seconds
+        with self._lock:
+            old = self._observed.get((encoder, tier))
+            self._observed[(encoder, tier)] = speed if old is None else self.alpha * speed + (1 - self.alpha) * old
+
+    def estimate(self, encoder: str, tier: str, megapixels: float) -> Optional[float]:
+        """Expected encode seconds for this much video"""
+        speed = self.throughput(encoder, tier)
+        return megapixels / speed if speed else None
+
+    def estimate_total(self, work: List[Tuple[str, float]], tier: str) -> Optional[float]:
+        """Expected seconds for several (encoder, megapixels) encodes at one tier, e.g. every ladder rung"""
+        estimates = [self.estimate(encoder, tier, megapixels) for encoder, megapixels in work]
+        return None if any(e is None for e in estimates) else sum(estimates)
+
+    def pick(self, work: List[Tuple[str, float]], deadline: float) -> Tuple[str, Optional[float]]:
+        """Slowest (best compression) tier expected to finish within the deadline, else the fastest one"""
+        for tier in reversed(SPEED_TIERS):
+            estimate = self.estimate_total(work, tier)
+            if estimate is not None and estimate <= deadline:
+                return tier, estimate
+        return SPEED_TIERS[0], self.estimate_total(work, SPEED_TIERS[0])
+
+    def stats(self) -> dict:
+        return {encoder: {tier: self.throughput(encoder, tier) for tier in SPEED_TIERS}
+                for encoder in self.prior}
+
+
+speeds = SpeedTable()
@@ -0,0 +1,98 @@
+# Keyframe-aware trimming with a shared clip cache
+# Seek on the input side and stream-copy from a keyframe: a cut between keyframes is snapped back to the
+# keyframe before it (a few extra frames at the head); re-encoding only when there is no such keyframe.
+# A re-encoded head concatenated with copied packets would not match their codec parameters.
+# From: https://trac.ffmpeg.org/wiki/Seeking
+
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+from fastapi import HTTPException
+
+from app.cache import cache, file_sha256
+from app.metrics import ffmpeg_op
+from app.probe import first_stream, probes
+from app.runner import run_ffmpeg
+from app.scratch import scratch
+
+
+# Tolerance when deciding that a cut point sits on a keyframe
+KEYFRAME_EPSILON = 0.001
+
+# How far before the cut point to look for the keyframe to snap to (seconds)
+KEYFRAME_LOOKBACK = 20
+
+
+@ffmpeg_op("keyframes")
+async def keyframe_times(input_path: Path, start: float, duration: float) -> List[float]:
+    """Keyframe timestamps of the first video stream in [start, start + duration] (packets only, no decoding)"""
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-read_intervals", f"{start}%+{duration}",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(input_path)]
+    times = []
+    for line in (await run_ffmpeg(cmd)).stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(float(pts))
+    return sorted(times)
+
+
+async def keyframe_before(input_path: Path, start: float) -> Optional[float]:
+    """Last keyframe at or before start (within KEYFRAME_LOOKBACK), None if there is none"""
+    window = max(0.0, start - KEYFRAME_LOOKBACK)
+    keyframes = await keyframe_times(input_path, window, start - window + KEYFRAME_EPSILON)
+    earlier = [k for k in keyframes if k <= start + KEYFRAME_EPSILON]
+    return earlier[-1] if earlier else None
+
+
+def _copy_cmd(input_path: Path, start: float, duration: float, output_path: Path) -> list:
+    return (["ffmpeg", "-y", "-ss", str(start), "-t", str(duration), "-i", str(input_path),
+             "-map", "0", "-c", "copy", "-avoid_negative_ts", "make_zero", str(output_path)])
+
+
+def _encode_cmd(input_path: Path, start: float, duration: float, output_path: Path) -> list:
+    # -ss before -i still seeks precisely when decoding, the frames before start are dropped
+    return (["ffmpeg", "-y", "-ss", str(start), "-t", str(duration), "-i", str(input_path),
+             "-map", "0:v:0", "-map", "0:a?", "-c:v", "libx264", "-c:a", "aac", str(output_path)])
+
+
+@ffmpeg_op("trim")
+async def trim(input_path: Path, start: float, duration: float, output_path: Path,
+               digest: Optional[str] = None):
+    """Cut up to start + duration, stream-copied from the keyframe at or before start"""
+    info = await probes.probe(input_path, digest)
+    if first_stream(info, "video") is None:
+        raise HTTPException(status_code=400, detail="Input has no video stream")
+
+    # A cut from the very beginning always starts on the first keyframe
+    keyframe = await keyframe_before(input_path, start) if start > 0 else 0.0
+    if keyframe is not None:
+        try:
+            await run_ffmpeg(_copy_cmd(input_path, keyframe, start + duration - keyframe, output_path))
+            return
+        except HTTPException:
+            pass  # container/codec refused the copy, fall through to the precise path
+
+    await run_ffmpeg(_encode_cmd(input_path, start, duration, output_path))
+
+
+@asynccontextmanager
+async def trimmed_clip(input_path: Path, digest: Optional[str] = None,
+                       start: float = 0, duration: float = 20) -> AsyncIterator[Path]:
+    """Trimmed clip of a source, produced once and shared by every later step through the cache
+
+    Use as `async with trimmed_clip(...) as clip:`; the clip can't be evicted inside the block.
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(file_sha256, input_path)
+    td = scratch.create(prefix="clip", intermediate=True)
+    try:
+        # Matroska accepts any codec we might be copying from the source
+        output_path = td / "clip.mkv"
+        async with cache.use(digest, "trim", {"start": start, "duration": duration}, output_path,
+                             lambda: trim(input_path, start, duration, output_path, digest)) as clip:
+            yield clip
+    finally:
+        scratch.release(td)
@@ -0,0 +1,261 @@
+# Wall time, CPU time, fps and output size of the merge_main video functions on synthetic lavfi sources
+# Usage (from lab2):
+#   python benchmarks/bench_video.py run [--sizes 640x360,1280x720 --durations 6,20 --repeat 3] [-o results.json]
+#   python benchmarks/bench_video.py compare baseline.json results.json [--threshold 0.10]
+# Sources are testsrc2 video + sine audio, so every run encodes exactly the same frames.
+# From: https://ffmpeg.org/ffmpeg-filters.html (testsrc2, sine)
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+LAB2 = Path(__file__).resolve().parent.parent
+
+
+###############################################################
+# SOURCES
+###############################################################
+
+def source_name(width: int, height: int, rate: int, duration: float) -> str:
+    return f"testsrc2_{width}x{height}_{rate}fps_{duration:g}s.mp4"
+
+
+def make_source(directory: Path, width: int, height: int, rate: int, duration: float) -> Path:
+    """H.264/AAC test clip, generated once per size/rate/duration and reused by later runs"""
+    path = directory / source_name(width, height, rate, duration)
+    if path.exists():
+        return path
+    cmd = ["ffmpeg", "-y", "-v", "error",
+           "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={rate}:duration={duration}",
+           "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+           "-c:v", "libx264", "-preset", "veryfast", "-g", str(2 * rate), "-pix_fmt", "yuv420p",
+           "-c:a", "aac", "-b:a", "128k", "-shortest", "-fflags", "+bitexact", str(path)]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+###############################################################
+# CASES
+###############################################################
+
+def build_cases(app) -> dict:
+    """name -> (works on the first CLIP_SECONDS only, coroutine factory(source, out_dir) -> output paths)"""
+    async def resize(src, out):
+        await app.resize_video(src, 640, 360, out / "resize.mp4")
+        return [out / "resize.mp4"]
+
+    async def chroma(src, out):
+        await app.chroma_subsampling(src, out / "chroma.mp4")
+        return [out / "chroma.mp4"]
+
+    async def histogram(src, out):
+        await app.create_yuv_histogram(src, out / "histogram.mp4")
+        return [out / "histogram.mp4"]
+
+    async def bbb(src, out):
+        await app.create_bbb_container(src, out / "bbb.mp4")
+        return [out / "bbb.mp4"]
+
+    async def ladder(src, out):
+        return await app.create_encoding_ladder(src, out)
+
+    def convert(format_id):
+        async def run(src, out):
+            path = out / f"convert_{format_id}.{app.CODEC_CONFIGS[format_id]['ext']}"
+            await app.convert_codec(src, format_id, path)
+            return [path]
+        return run
+
+    cases = {"resize": (False, resize), "chroma": (False, chroma), "yuv_histogram": (False, histogram)}
+    for format_id, config in app.CODEC_CONFIGS.items():
+        codec = config["cmd"][config["cmd"].index("-c:v") + 1]
+        cases[f"convert_{format_id}_{codec}"] = (True, convert(format_id))
+    cases["encoding_ladder"] = (True, ladder)
+    cases["bbb_container"] = (True, bbb)
+    return cases
+
+
+def children_cpu() -> float:
+    """user + system seconds of every reaped child process (ffmpeg runs are all awaited to completion)"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def measure(factory, source: Path, out: Path) -> dict:
+    for old in out.iterdir():
+        old.unlink()
+    cpu, start = children_cpu(), time.perf_counter()
+    outputs = await factory(source, out)
+    wall = time.perf_counter() - start
+    return {"wall_s": wall, "cpu_s": children_cpu() - cpu,
+            "output_bytes": sum(p.stat().st_size for p in outputs if p.exists())}
+
+
+def ffmpeg_version() -> str:
+    try:
+        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return "missing"
+    return result.stdout.splitlines()[0] if result.stdout else "unknown"
+
+
+def parse_durations(text: str) -> list:
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+async def run_cases(args, app, cases: dict, workdir: Path) -> list:
+    """Every case on every source size and duration, all in one event loop (the runner's process pool
+    is bound to it)"""
+    results = []
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.lower().split("x"))
+        for duration in args.durations:
+            results += await run_source(args, app, cases, workdir, width, height, duration)
+    return results
+
+
+async def run_source(args, app, cases: dict, workdir: Path, width: int, height: int, duration: float) -> list:
+    source = make_source(workdir / "sources", width, height, args.rate, duration)
+    results = []
+    for name, (clipped, factory) in cases.items():
+        out = workdir / "out" / name
+        out.mkdir(parents=True, exist_ok=True)
+        # Warm-up fills the probe index and the shared trimmed-clip cache, like a busy service
+        await measure(factory, source, out)
+        runs = [await measure(factory, source, out) for _ in range(args.repeat)]
+        frames = args.rate * (min(duration, app.CLIP_SECONDS) if clipped else duration)
+        wall = statistics.median(r["wall_s"] for r in runs)
+        results.append({
+            "case": name,
+            "source": f"{width}x{height}",
+            "duration": duration,
+            "frames": frames,
+            "wall_s": wall,
+            "cpu_s": statistics.median(r["cpu_s"] for r in runs),
+            "fps": frames / wall if wall else None,
+            "output_bytes": runs[-1]["output_bytes"],
+            "runs": runs,
+        })
+        print(f"{name:<26} {width}x{height:<6} {duration:>6g} s {wall:8.3f} s wall {results[-1]['cpu_s']:8.3f} s cpu "
+              f"{results[-1]['fps'] or 0:8.1f} fps {results[-1]['output_bytes']:>12} B", file=sys.stderr)
+    return results
+
+
+def run(args):
+    workdir = Path(args.workdir or Path(tempfile.gettempdir()) / "bench_video")
+    (workdir / "sources").mkdir(parents=True, exist_ok=True)
+    # The app keeps its scratch/cache/probe index under the bench directory, not the service's
+    os.environ.setdefault("SCRATCH_DIR", str(workdir / "scratch"))
+    os.environ.setdefault("CACHE_DIR", str(workdir / "cache"))
+    os.environ.setdefault("PROBE_INDEX", str(workdir / "probe_index.sqlite3"))
+    os.chdir(LAB2)  # merge_main mounts app/static relative to the working directory
+    sys.path.insert(0, str(LAB2))
+    from app import merge_main
+
+    cases = build_cases(merge_main)
+    if args.cases:
+        pattern = re.compile(args.cases)
+        cases = {name: case for name, case in cases.items() if pattern.search(name)}
+
+    results = asyncio.run(run_cases(args, merge_main, cases, workdir))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ffmpeg": ffmpeg_version(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "rate": args.rate,
+            "durations": args.durations,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+
+###############################################################
+# COMPARE
+###############################################################
+
+# Lower is better for all three; a relative increase above the threshold is a regression
+COMPARED = ("wall_s", "cpu_s", "output_bytes")
+
+
+def result_key(result: dict, duration: float) -> tuple:
+    return result["case"], result["source"], f"{result.get('duration', duration):g}s"
+
+
+def load_results(path: str) -> dict:
+    """(case, source, duration) -> row (files from before per-duration rows carry one meta duration)"""
+    report = json.loads(Path(path).read_text())
+    duration = report["meta"].get("duration", 0)
+    return {result_key(r, duration): r for r in report["results"]}
+
+
+def compare(args) -> int:
+    base = load_results(args.baseline)
+    new = load_results(args.candidate)
+
+    regressions = 0
+    print(f"{'case':<26} {'source':<10} {'duration':>8} " + " ".join(f"{m:>20}" for m in COMPARED))
+    for key in sorted(base.keys() & new.keys()):
+        cells = []
+        for metric in COMPARED:
+            old, cur = base[key][metric], new[key][metric]
+            change = (cur - old) / old if old else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag, regressions = " !", regressions + 1
+            cells.append(f"{change * 100:+8.1f}%{flag:<2}".rjust(20))
+        print(f"{key[0]:<26} {key[1]:<10} {key[2]:>8} " + " ".join(cells))
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{key[0]:<26} {key[1]:<10} {key[2]:>8} only in {'baseline' if key in base else 'candidate'}")
+
+    print(f"\n{regressions} regression(s) above {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="merge_main video benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("run", help="benchmark every case and write JSON")
+    bench.add_argument("--sizes", default="640x360,1280x720", help="comma separated WxH source sizes")
+    bench.add_argument("--durations", "--duration", type=parse_durations, default=[6.0],
+                       help="comma separated source lengths in seconds, one result row per length")
+    bench.add_argument("--rate", type=int, default=24)
+    bench.add_argument("--repeat", type=int, default=3, help="timed runs per case (after one warm-up)")
+    bench.add_argument("--cases", help="regex selecting case names, e.g. 'convert|ladder'")
+    bench.add_argument("--workdir", help="sources, outputs and app state (default: $TMPDIR/bench_video)")
+    bench.add_argument("-o", "--output", help="JSON file (default: stdout)")
+
+    diff = sub.add_parser("compare", help="flag regressions between two JSON results")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--threshold", type=float, default=0.10, help="relative increase counted as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# Tests import the app package the way uvicorn does (from lab2), with its state in a throwaway directory
+import os
+import sys
+import tempfile
+
+STATE = tempfile.mkdtemp(prefix="lab2_tests_")
+os.environ.setdefault("SCRATCH_DIR", os.path.join(STATE, "scratch"))
+os.environ.setdefault("CACHE_DIR", os.path.join(STATE, "cache"))
+os.environ.setdefault("PROBE_INDEX", os.path.join(STATE, "probe_index.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
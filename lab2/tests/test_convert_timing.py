@@ -0,0 +1,40 @@
+# Encoder throughput is recorded from the time ffmpeg ran, not from the time spent queueing for a slot
+
+import asyncio
+import stat
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from app import merge_main, runner
+
+
+def test_convert_records_encode_time_without_queueing(monkeypatch, tmp_path):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text("#!/bin/sh\nexit 0\n")
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    @asynccontextmanager
+    async def fake_clip(input_path, digest=None, start=0, duration=20):
+        yield input_path
+
+    async def fake_megapixels(input_path, digest=None):
+        return 100.0
+
+    recorded = []
+    monkeypatch.setattr(merge_main, "trimmed_clip", fake_clip)
+    monkeypatch.setattr(merge_main, "clip_megapixels", fake_megapixels)
+    monkeypatch.setattr(merge_main.speeds, "record", lambda *args: recorded.append(args))
+
+    async def scenario():
+        monkeypatch.setattr(runner, "_slots", asyncio.Semaphore(1))
+        await runner._slots.acquire()  # every slot busy: the conversion has to queue
+        task = asyncio.create_task(merge_main.convert_codec(Path("in.mp4"), 0, tmp_path / "out.webm"))
+        await asyncio.sleep(0.5)
+        runner._slots.release()
+        await task
+
+    asyncio.run(scenario())
+    [(encoder, tier, megapixels, seconds)] = recorded
+    assert encoder == "libvpx-vp9" and megapixels == 100.0
+    assert 0 < seconds < 0.4
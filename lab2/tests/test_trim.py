@@ -0,0 +1,63 @@
+# Trimming from a start point: always one stream copy from a keyframe, never a re-encoded head
+# concatenated with copied packets; a precise re-encode only without a keyframe to snap to
+
+import asyncio
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app import trim as trim_module
+
+
+@pytest.fixture
+def ffmpeg_calls(monkeypatch):
+    """Records every command; ffprobe answers with keyframes at 0, 4 and 8 s (1 s packets)"""
+    calls = []
+    keyframes = {0.0, 4.0, 8.0}
+
+    async def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        stdout = ""
+        if cmd[0] == "ffprobe":
+            start, _, length = cmd[cmd.index("-read_intervals") + 1].partition("%+")
+            start, end = float(start), float(start) + float(length)
+            stdout = "".join(f"{t:.6f},{'K_' if t in keyframes else '__'}\n"
+                             for t in map(float, range(12)) if start <= t <= end)
+        return subprocess.CompletedProcess(cmd, 0, stdout, "")
+
+    async def fake_probe(path, digest=None):
+        return {"streams": [{"codec_type": "video", "codec_name": "h264"}], "format": {"duration": "12"}}
+
+    monkeypatch.setattr(trim_module, "run_ffmpeg", fake_run)
+    monkeypatch.setattr(trim_module.probes, "probe", fake_probe)
+    return calls
+
+
+def ffmpeg_commands(calls):
+    return [c for c in calls if c[0] == "ffmpeg"]
+
+
+def option(cmd, name):
+    return float(cmd[cmd.index(name) + 1])
+
+
+def test_cut_between_keyframes_snaps_back_and_copies(ffmpeg_calls, tmp_path):
+    asyncio.run(trim_module.trim(Path("in.mp4"), 5.5, 2.0, tmp_path / "out.mkv"))
+    [cmd] = ffmpeg_commands(ffmpeg_calls)
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert option(cmd, "-ss") == 4.0 and option(cmd, "-t") == 3.5  # still ends at 7.5 s
+    assert "concat" not in cmd
+
+
+def test_cut_on_keyframe_copies_from_it(ffmpeg_calls, tmp_path):
+    asyncio.run(trim_module.trim(Path("in.mp4"), 8.0, 2.0, tmp_path / "out.mkv"))
+    [cmd] = ffmpeg_commands(ffmpeg_calls)
+    assert option(cmd, "-ss") == 8.0 and option(cmd, "-t") == 2.0
+
+
+def test_no_keyframe_to_snap_to_reencodes_precisely(ffmpeg_calls, monkeypatch, tmp_path):
+    monkeypatch.setattr(trim_module, "KEYFRAME_LOOKBACK", 1)
+    asyncio.run(trim_module.trim(Path("in.mp4"), 6.5, 2.0, tmp_path / "out.mkv"))
+    [cmd] = ffmpeg_commands(ffmpeg_calls)
+    assert "libx264" in cmd and option(cmd, "-ss") == 6.5 and option(cmd, "-t") == 2.0
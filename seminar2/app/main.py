@@ -1,25 +1,46 @@
 # From: https://fastapi.tiangolo.com/tutorial/first-steps/#deploy-your-app-optional
 
-from fastapi import FastAPI, UploadFile, File, Response
+from fastapi import FastAPI, UploadFile, File, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import subprocess
-import numpy as np
-import pywt
-from scipy.fftpack import dct, idct
 from typing import List, Tuple
-import base64
-from io import BytesIO
+import hashlib
 import tempfile
 import os
-from PIL import Image
-import matplotlib.image as mpimg
-import matplotlib.pyplot as plt
+import shutil
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+
+from app.mp4box import parse_tracks
+from app.ffmpeg_pool import ffmpeg_pool, shared_tempdir
 
 
 app = FastAPI()
 
 
+###############################################################
+# Uploads are streamed to disk in fixed-size chunks so big videos never sit whole in RAM
+
+UPLOAD_CHUNK = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 4 * 1024 ** 3))
+
+async def save_upload(file: UploadFile, in_path: str) -> str:
+    """Write the upload to in_path chunk by chunk and return its SHA-256"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(in_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    if size > MAX_UPLOAD_BYTES:
+        os.remove(in_path)
+        raise HTTPException(status_code=413, detail="Upload too large")
+    return digest.hexdigest()
+
 ###############################################################
 # Command from https://creatomate.com/blog/how-to-change-the-resolution-of-a-video-using-ffmpeg
 # EX 1 - Resize (same as changing the resolution) video with ffmpeg.
@@ -27,14 +48,8 @@ app = FastAPI()
 
 def resize(input_path: str, iw: int, ih: int, output_path: str):
     
-    # Use docker to run ffmpeg in a separate container via a named volume
-    vol = os.environ.get("SHARED_VOLUME", "practice1_shared")
-    
-    # input and output are  inside the shared volume
-    in_name = os.path.basename(input_path)
-    out_name = os.path.basename(output_path)
-    cmd = ["docker", "run", "--rm", "-v", f"{vol}:/work", "jrottenberg/ffmpeg:4.4-alpine", "ffmpeg", "-i", f"/work/{in_name}", "-vf", f"scale={iw}:{ih}", f"/work/{out_name}"]
-    subprocess.run(cmd, capture_output=True)
+    # Runs on a long-lived ffmpeg worker container sharing the data volume (see app/ffmpeg_pool.py)
+    return ffmpeg_pool().run(lambda path: ["-y", "-i", path(input_path), "-vf", f"scale={iw}:{ih}", path(output_path)])
 
 ###############################################################
 # Command from https://trac.ffmpeg.org/wiki/Chroma%20Subsampling
@@ -106,16 +121,15 @@ def new_BBB_container(input_path: str, output_path: str):
         output_path
     ]
     r = subprocess.run(cmd_package, capture_output=True, text=True)
+    shutil.rmtree(td, ignore_errors=True)                           # clip and audio tracks are only intermediates
     return r
 
 ###############################################################
 # EX 5 - count tracks
 # Idea extracted from: https://dev.to/enter?state=new-user&bb=239338
+# Walks the MP4 boxes down to moov/trak instead of searching b'trak' in the whole file
 def count(input_path: str):
-    with open(input_path, 'rb') as f:
-        data = f.read()
-        # Count how many times 'trak' appears in the metadata
-        return data.count(b'trak')     
+    return len(parse_tracks(input_path))
 
 ##############################################################
 # EX 6 - macroblocks and motion vectors
@@ -154,22 +168,25 @@ def ffmpeg_version():
 @app.post("/video/resize")
 async def api_video_resize(file: UploadFile = File(...), width: int = 640, height: int = 360):
     suffix = os.path.splitext(file.filename)[1] or ".mp4"
-    td = tempfile.mkdtemp()
+    tmp = shared_tempdir()  # on the shared volume, so the ffmpeg workers see the files
 
-    in_path = os.path.join(td, "in" + suffix)
-    out_path = os.path.join(td, "out" + suffix)
+    in_path = os.path.join(tmp.name, "in" + suffix)
+    out_path = os.path.join(tmp.name, "out" + suffix)
 
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
 
-    cmd = ["ffmpeg", "-y", "-i", in_path, "-vf", f"scale={width}:{height}", out_path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Waits for a free worker in a thread, not on the event loop
+    try:
+        result = await run_in_threadpool(resize, in_path, width, height, out_path)
+    except (subprocess.TimeoutExpired, RuntimeError) as e:
+        tmp.cleanup()
+        return {"error": str(e)}
 
     if result.returncode != 0:
+        tmp.cleanup()
         return {"error": result.stderr}
 
-    return FileResponse(out_path, media_type="video/mp4", filename="resized.mp4")
+    return FileResponse(out_path, media_type="video/mp4", filename="resized.mp4", background=BackgroundTask(tmp.cleanup))
 
 
 @app.post("/video/info")
@@ -178,9 +195,7 @@ async def api_video_info(file: UploadFile = File(...)):
         suffix = os.path.splitext(file.filename)[1] or ".mp4"
         with tempfile.TemporaryDirectory() as td:
             in_path = os.path.join(td, "in" + suffix)
-            content = await file.read()
-            with open(in_path, "wb") as f:
-                f.write(content)
+            await save_upload(file, in_path)
             info_json = video_info(in_path)
         return Response(content=info_json, media_type="application/json")
     except Exception as e:
@@ -190,21 +205,20 @@ async def api_video_info(file: UploadFile = File(...)):
 @app.post("/video/chroma")
 async def api_chroma_subsampling(file: UploadFile = File(...)):
     suffix = os.path.splitext(file.filename)[1] or ".mp4"
-    td = tempfile.mkdtemp()  # ← DO NOT auto-delete
+    td = tempfile.mkdtemp()  # ← deleted after the response is sent, not here
 
     in_path = os.path.join(td, "in" + suffix)
     out_path = os.path.join(td, "out" + suffix)
 
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
 
     result = chroma_subsampling(in_path, out_path)
 
     if result.returncode != 0:
+        shutil.rmtree(td, ignore_errors=True)
         return {"error": result.stderr}
 
-    return FileResponse(out_path, media_type="video/mp4", filename="chroma_video.mp4")
+    return FileResponse(out_path, media_type="video/mp4", filename="chroma_video.mp4", background=BackgroundTask(shutil.rmtree, td, ignore_errors=True))
 
 
 @app.post("/video/bbb-container")
@@ -216,17 +230,16 @@ async def api_create_bbb_container(file: UploadFile = File(...)):
     out_path = os.path.join(td, "bbb_final.mp4")
 
     # Save input BBB
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
 
     # Run the full pipeline
     result = new_BBB_container(in_path, out_path)
 
     if result.returncode != 0:
+        shutil.rmtree(td, ignore_errors=True)
         return {"error": result.stderr}
 
-    return FileResponse(out_path, media_type="video/mp4", filename="bbb_container.mp4")
+    return FileResponse(out_path, media_type="video/mp4", filename="bbb_container.mp4", background=BackgroundTask(shutil.rmtree, td, ignore_errors=True))
 
 
 @app.post("/video/tracks")
@@ -235,12 +248,10 @@ async def api_count_tracks(file: UploadFile = File(...)):
     td = tempfile.mkdtemp()
     
     in_path = os.path.join(td, "in" + suffix)
-    content = await file.read()
-    
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
     
     track_count = count(in_path)
+    shutil.rmtree(td, ignore_errors=True)
     
     return {"tracks": track_count}
 
@@ -253,16 +264,15 @@ async def api_macroblocks_motion(file: UploadFile = File(...)):
     in_path = os.path.join(td, "in" + suffix)
     out_path = os.path.join(td, "out" + suffix)
     
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
     
     result = macroblocks_and_motion_vectors(in_path, out_path)
     
     if result.returncode != 0:
+        shutil.rmtree(td, ignore_errors=True)
         return {"error": result.stderr}
     
-    return FileResponse(out_path, media_type="video/mp4", filename="macroblocks.mp4")
+    return FileResponse(out_path, media_type="video/mp4", filename="macroblocks.mp4", background=BackgroundTask(shutil.rmtree, td, ignore_errors=True))
 
 
 @app.post("/video/yuv-histogram")
@@ -273,13 +283,12 @@ async def api_yuv_histogram(file: UploadFile = File(...)):
     in_path = os.path.join(td, "in" + suffix)
     out_path = os.path.join(td, "histogram.mp4")
     
-    content = await file.read()
-    with open(in_path, "wb") as f:
-        f.write(content)
+    await save_upload(file, in_path)
     
     result = YUV_histogram(in_path, out_path)
     
     if result.returncode != 0:
+        shutil.rmtree(td, ignore_errors=True)
         return {"error": result.stderr}
     
-    return FileResponse(out_path, media_type="video/mp4", filename="yuv_histogram.mp4")
+    return FileResponse(out_path, media_type="video/mp4", filename="yuv_histogram.mp4", background=BackgroundTask(shutil.rmtree, td, ignore_errors=True))
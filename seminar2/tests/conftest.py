@@ -0,0 +1,5 @@
+# Tests import the app package the way uvicorn does (from the app's directory)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+# Worker discovery: compose containers of our own project, local ffmpeg when docker is unavailable
+
+import stat
+
+from app import ffmpeg_pool
+
+
+def fake_docker(directory, script: str):
+    path = directory / "docker"
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+def use_service(monkeypatch, bin_dir):
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setattr(ffmpeg_pool, "FFMPEG_WORKER_CONTAINERS", "")
+    monkeypatch.setattr(ffmpeg_pool, "FFMPEG_WORKER_SERVICE", "ffmpeg")
+    monkeypatch.setattr(ffmpeg_pool, "FFMPEG_WORKER_PROJECT", "")
+
+
+def test_missing_docker_cli_falls_back_to_local_ffmpeg(monkeypatch, tmp_path):
+    use_service(monkeypatch, tmp_path)  # empty PATH: no docker binary
+    pool = ffmpeg_pool.build_pool()
+    assert pool.workers and all(isinstance(w, ffmpeg_pool.LocalWorker) for w in pool.workers)
+
+
+def test_failing_docker_falls_back_to_local_ffmpeg(monkeypatch, tmp_path):
+    fake_docker(tmp_path, "echo 'Cannot connect to the Docker daemon' >&2\nexit 1\n")
+    use_service(monkeypatch, tmp_path)
+    pool = ffmpeg_pool.build_pool()
+    assert all(isinstance(w, ffmpeg_pool.LocalWorker) for w in pool.workers)
+
+
+def test_discovery_is_limited_to_our_compose_project(monkeypatch, tmp_path):
+    log = tmp_path / "calls"
+    fake_docker(tmp_path, f'echo "$@" >> {log}\n'
+                          'case "$1" in inspect) echo myproject ;; ps) echo abc; echo def ;; esac\n')
+    use_service(monkeypatch, tmp_path)
+    pool = ffmpeg_pool.build_pool()
+    assert [w.container for w in pool.workers] == ["abc", "def"]
+    ps = [line for line in log.read_text().splitlines() if line.startswith("ps")][0]
+    assert "label=com.docker.compose.service=ffmpeg" in ps
+    assert "label=com.docker.compose.project=myproject" in ps
+
+
+def test_unknown_project_does_not_pick_up_other_workers(monkeypatch, tmp_path):
+    fake_docker(tmp_path, 'case "$1" in inspect) echo ;; ps) echo other ;; esac\n')
+    use_service(monkeypatch, tmp_path)
+    pool = ffmpeg_pool.build_pool()
+    assert all(isinstance(w, ffmpeg_pool.LocalWorker) for w in pool.workers)
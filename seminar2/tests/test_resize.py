@@ -0,0 +1,36 @@
+# /video/resize runs on the worker pool, with its files where the workers can see them
+
+import subprocess
+
+from fastapi.testclient import TestClient
+
+from app import ffmpeg_pool, main
+
+
+class RecordingWorker(ffmpeg_pool.LocalWorker):
+    """Writes the output instead of running ffmpeg and remembers the arguments"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run(self, args, timeout=None):
+        self.calls.append(args)
+        with open(args[-1], "wb") as f:
+            f.write(b"resized")
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+
+def test_resize_goes_through_the_pool_under_the_shared_root(monkeypatch, tmp_path):
+    monkeypatch.setattr(ffmpeg_pool, "SHARED_ROOT", str(tmp_path))
+    worker = RecordingWorker()
+    ffmpeg_pool.set_pool(ffmpeg_pool.WorkerPool([worker]))
+    try:
+        response = TestClient(main.app).post("/video/resize?width=320&height=180",
+                                             files={"file": ("in.mp4", b"video")})
+    finally:
+        ffmpeg_pool.set_pool(None)
+    assert response.status_code == 200 and response.content == b"resized"
+    args = worker.calls[0]
+    assert "scale=320:180" in args
+    assert args[2].startswith(str(tmp_path)) and args[-1].startswith(str(tmp_path))